@@ -1,40 +1,96 @@
 # Archivo: addon_main.py (v3.4 - Sensores detallados y Pánico)
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import random
 import signal
 import sys
 import threading
 import time
+from dataclasses import dataclass
 
 import paho.mqtt.client as mqtt
 from mqtt_runtime import MQTTRuntime
 from protocol_handlers import create_protocol_handler
+from scheduler import Scheduler
 
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s', stream=sys.stdout)
+# Los hilos de eventos solo encolan los registros; un hilo aparte los escribe en stdout.
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler(sys.stdout)
+_log_stream_handler.setFormatter(logging.Formatter('[%(asctime)s] - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(_log_queue, _log_stream_handler)
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_log_queue)])
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # --- Configuración ---
-ALARM_IP = os.environ.get('ALARM_IP')
-ALARM_PORT = int(os.environ.get('ALARM_PORT', 9009))
-ALARM_PASS = os.environ.get('ALARM_PASS')
-ALARM_PROTOCOL = os.environ.get('ALARM_PROTOCOL', 'isecnet').lower()
-
-MQTT_BROKER = os.environ.get('MQTT_BROKER')
-MQTT_PORT = int(os.environ.get('MQTT_PORT', 1883))
-MQTT_USER = os.environ.get('MQTT_USER')
-MQTT_PASS = os.environ.get('MQTT_PASS')
-
-POLLING_INTERVAL_MINUTES = max(1, int(os.environ.get('POLLING_INTERVAL_MINUTES', 5)))
-ZONE_RANGE = os.environ.get('ZONE_RANGE', '').strip()
-ZONE_COUNT = int(os.environ.get('ZONE_COUNT', 0))
-PASSWORD_LENGTH = int(os.environ.get('PASSWORD_LENGTH', 0) or 0)
+# Valor no numérico: aviso y valor por defecto en lugar de abortar el arranque.
+def _env_float(environ, name, default):
+    value = environ.get(name, '')
+    if not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning(f"{name} inválido '{value}', usando {default}.")
+        return default
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Configuración del addon, leída una sola vez de las variables de entorno."""
+
+    alarm_ip: str | None
+    alarm_port: int
+    alarm_pass: str | None
+    alarm_protocol: str
+    mqtt_broker: str | None
+    mqtt_port: int
+    mqtt_user: str | None
+    mqtt_pass: str | None
+    mqtt_protocol: str
+    polling_interval_minutes: int
+    poll_jitter_pct: float
+    zone_range: str
+    zone_count: int
+    password_length: int
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            alarm_ip=environ.get('ALARM_IP'),
+            alarm_port=int(environ.get('ALARM_PORT', 9009)),
+            alarm_pass=environ.get('ALARM_PASS'),
+            alarm_protocol=environ.get('ALARM_PROTOCOL', 'isecnet').lower(),
+            mqtt_broker=environ.get('MQTT_BROKER'),
+            mqtt_port=int(environ.get('MQTT_PORT', 1883)),
+            mqtt_user=environ.get('MQTT_USER'),
+            mqtt_pass=environ.get('MQTT_PASS'),
+            mqtt_protocol=environ.get('MQTT_PROTOCOL', '3.1.1').strip(),
+            polling_interval_minutes=max(1, int(environ.get('POLLING_INTERVAL_MINUTES', 5))),
+            poll_jitter_pct=min(50.0, max(0.0, _env_float(environ, 'POLL_JITTER_PCT', 10.0))),
+            zone_range=environ.get('ZONE_RANGE', '').strip(),
+            zone_count=int(environ.get('ZONE_COUNT', 0)),
+            password_length=int(environ.get('PASSWORD_LENGTH', 0) or 0),
+        )
+
+
+CFG = Config.from_env()
 
 AVAILABILITY_TOPIC = "intelbras/alarm/availability"
 COMMAND_TOPIC = "intelbras/alarm/command"
 BASE_TOPIC = "intelbras/alarm"
 
-mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+# MQTT 5 es opcional: permite alias de tópico, pero no todos los bróker lo soportan.
+mqtt_client = mqtt.Client(
+    mqtt.CallbackAPIVersion.VERSION2,
+    protocol=mqtt.MQTTv5 if CFG.mqtt_protocol == '5' else mqtt.MQTTv311,
+)
 shutdown_event = threading.Event()
 alarm_lock = threading.Lock()
+scheduler = Scheduler()
 
 # --- Almacén Central de Estados ---
 def _parse_zone_ids(zone_range, fallback_count):
@@ -62,8 +118,7 @@ def _parse_zone_ids(zone_range, fallback_count):
     return list(range(1, max(0, fallback_count) + 1))
 
 
-ZONE_IDS = _parse_zone_ids(ZONE_RANGE, ZONE_COUNT)
-zone_states = {str(i): "Desconocido" for i in ZONE_IDS}
+ZONE_IDS = _parse_zone_ids(CFG.zone_range, CFG.zone_count)
 
 protocol_handler = None
 
@@ -77,20 +132,33 @@ mqtt_runtime = MQTTRuntime(
     base_topic=BASE_TOPIC,
     command_topic=COMMAND_TOPIC,
     availability_topic=AVAILABILITY_TOPIC,
-    zone_states=zone_states,
+    zone_ids=ZONE_IDS,
     alarm_lock=alarm_lock,
     protocol_handler_getter=get_protocol_handler,
 )
 
 
 def status_polling_thread():
-    logging.info(f"Iniciando sondeo cada {POLLING_INTERVAL_MINUTES} minutos.")
+    cfg = CFG
+    logging.info(f"Iniciando sondeo cada {cfg.polling_interval_minutes} minutos.")
+    interval = cfg.polling_interval_minutes * 60
+    # Jitter aleatorio para que varias instancias no sondeen en el mismo instante.
+    jitter = cfg.poll_jitter_pct / 100
+    # Plazo absoluto: la duración del sondeo no retrasa los siguientes ciclos.
+    next_deadline = time.monotonic()
     while not shutdown_event.is_set():
-        with alarm_lock:
-            if protocol_handler is not None:
+        last_event_at = protocol_handler.last_event_at if protocol_handler is not None else None
+        if last_event_at is not None and time.monotonic() - last_event_at < interval / 2:
+            logging.info("Sondeo omitido: los eventos recientes ya actualizaron el estado.")
+        elif protocol_handler is not None:
+            with alarm_lock:
                 protocol_handler.poll_status()
-                mqtt_runtime.publish_zone_states()
-        shutdown_event.wait(POLLING_INTERVAL_MINUTES * 60)
+            mqtt_runtime.publish_zone_states()
+        next_deadline += interval * random.uniform(1 - jitter, 1 + jitter)
+        now = time.monotonic()
+        if next_deadline < now:
+            next_deadline = now
+        shutdown_event.wait(next_deadline - now)
     logging.info("Hilo de sondeo terminado.")
 
 
@@ -99,56 +167,65 @@ def handle_shutdown(signum, frame):
     shutdown_event.set()
 
     mqtt_runtime.publish_offline()
-    time.sleep(1)
     mqtt_client.loop_stop()
 
     if protocol_handler is not None:
         protocol_handler.shutdown()
+    scheduler.stop()
 
     sys.exit(0)
 
 
 if __name__ == "__main__":
     protocol_handler = create_protocol_handler(
-        protocol=ALARM_PROTOCOL,
-        alarm_ip=ALARM_IP,
-        alarm_port=ALARM_PORT,
-        alarm_pass=ALARM_PASS,
-        password_length=PASSWORD_LENGTH,
+        protocol=CFG.alarm_protocol,
+        alarm_ip=CFG.alarm_ip,
+        alarm_port=CFG.alarm_port,
+        alarm_pass=CFG.alarm_pass,
+        password_length=CFG.password_length,
         mqtt_client=mqtt_client,
         base_topic=BASE_TOPIC,
-        zone_states=zone_states,
+        zone_ids=mqtt_runtime.zone_ids,
+        get_zone_state=mqtt_runtime.get_zone_state,
         alarm_lock=alarm_lock,
+        set_zone_state=mqtt_runtime.set_zone_state,
+        set_all_zone_states=mqtt_runtime.set_all_zone_states,
         publish_zone_states=mqtt_runtime.publish_zone_states,
         publish_triggered_zones_state=mqtt_runtime.publish_triggered_zones_state,
+        publish_batch=mqtt_runtime.publish_batch,
+        polling_interval_seconds=CFG.polling_interval_minutes * 60,
+        poll_jitter_pct=CFG.poll_jitter_pct,
+        scheduler=scheduler,
     )
 
     signal.signal(signal.SIGTERM, handle_shutdown)
     signal.signal(signal.SIGINT, handle_shutdown)
 
-    ok, startup_error = protocol_handler.validate_startup(ALARM_IP, MQTT_BROKER)
+    ok, startup_error = protocol_handler.validate_startup(CFG.alarm_ip, CFG.mqtt_broker)
     if not ok:
         logging.error(startup_error)
         sys.exit(1)
 
     mqtt_runtime.configure_client()
-    if MQTT_USER:
-        mqtt_client.username_pw_set(MQTT_USER, MQTT_PASS)
+    if CFG.mqtt_user:
+        mqtt_client.username_pw_set(CFG.mqtt_user, CFG.mqtt_pass)
 
     try:
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        mqtt_client.connect(CFG.mqtt_broker, CFG.mqtt_port, 60)
     except Exception as exc:
         logging.error(f"Fallo al conectar a MQTT: {exc}")
         sys.exit(1)
 
     mqtt_client.loop_start()
+    scheduler.start()
     try:
         protocol_handler.start()
     except RuntimeError as exc:
         logging.error(str(exc))
         sys.exit(1)
 
-    threading.Thread(target=status_polling_thread, daemon=True).start()
+    if not protocol_handler.runs_own_polling:
+        threading.Thread(target=status_polling_thread, daemon=True).start()
 
     logging.info("Addon en funcionamiento. Esperando eventos...")
     shutdown_event.wait()
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import socket
+import sys
 import time
 from .myeventloop.tcpclient import *
 from .utils_proto import *
@@ -10,6 +12,11 @@ from .utils_proto import *
 class ComandarCentral(TCPClientHandler, UtilsProtocolo):
     def __init__(self, observer, ip_addr, cport, senha, tam_senha, extra):
         super().__init__((ip_addr, cport))
+        # bytearray em vez da lista do TCPClientHandler: "+=" estende no lugar
+        # e pacotes consumidos saem com del, sem recriar o buffer
+        self.recv_buf = bytearray()
+        # Pedido/resposta de pacotes pequenos: sem Nagle cada envio sai na hora
+        self.fd.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.log_debug("Inicio")
         self.observer = observer
         self.conn_timeout = self.timeout("conn_timeout", 15, self.conn_timeout)
@@ -31,7 +38,7 @@ class ComandarCentral(TCPClientHandler, UtilsProtocolo):
         self.destroy()
 
     def connection_callback(self, ok):
-        self.conn_timeout.cancel()
+        # conn_timeout segue armado; cada etapa só adia o prazo com restart()
         if not ok:
             self.status = 1
             self.log_info("Conexao falhou")
@@ -42,36 +49,48 @@ class ComandarCentral(TCPClientHandler, UtilsProtocolo):
     def autenticacao(self):
         self.log_debug("Autenticacao")
         pct = self.pacote_isecnet2_auth(self.senha, self.tam_senha)
-        self.log_debug("Send", self.hexprint(pct))
+        self.log_debug("Send", HexPreguicoso(pct))
         self.send(pct)
         self.tratador = self.resposta_autenticacao
         self.conn_timeout.restart()
 
+    def log_recv(self, latest):
+        self.log_debug("Recv", HexPreguicoso(latest))
+
     def recv_callback(self, latest):
-        self.log_debug("Recv", self.hexprint(latest))
+        self.log_recv(latest)
 
-        compr = self.pacote_isecnet2_completo(self.recv_buf)
-        if not compr:
-            self.log_debug("Pacote incompleto")
-            return
+        # Um mesmo recv pode trazer várias respostas (ex.: pedidos em janela)
+        while not self.destroyed:
+            compr = self.pacote_isecnet2_completo(self.recv_buf)
+            if not compr:
+                if self.recv_buf:
+                    self.log_debug("Pacote incompleto")
+                return
 
-        pct, self.recv_buf = self.recv_buf[:compr], self.recv_buf[compr:]
+            # Checksum conferido sobre o próprio buffer; só copia pacote válido
+            pacote = memoryview(self.recv_buf)[:compr]
+            correto = self.pacote_isecnet2_correto(pacote)
+            if correto:
+                pct = bytes(pacote)
+            pacote.release()
 
-        if not self.pacote_isecnet2_correto(pct):
-            self.log_info("Pacote incorreto, desistindo")
-            self.destroy()
-            return
+            if not correto:
+                self.log_info("Pacote incorreto, desistindo")
+                self.destroy()
+                return
 
-        cmd, payload = self.pacote_isecnet2_parse(pct)
-        self.log_debug("Resposta %04x" % cmd)
+            del self.recv_buf[:compr]
 
-        if not self.tratador:
-            self.log_info("Sin tratador")
-            self.destroy()
-            return
+            cmd, payload = self.pacote_isecnet2_parse(pct)
+            self.log_debug("Resposta %04x" % cmd)
 
-        self.conn_timeout.cancel()
-        self.tratador(cmd, payload)
+            if not self.tratador:
+                self.log_info("Sin tratador")
+                self.destroy()
+                return
+
+            self.tratador(cmd, payload)
 
     def resposta_autenticacao(self, cmd, payload):
         if cmd == 0xf0fd:
@@ -103,8 +122,11 @@ class ComandarCentral(TCPClientHandler, UtilsProtocolo):
         self.envia_comando_in()
 
     def envia_comando(self, cmd, payload, tratador_in):
-        pct = self.pacote_isecnet2(cmd, payload)
-        self.log_debug("Send", self.hexprint(pct))
+        self.envia_pacote(cmd, self.pacote_isecnet2(cmd, payload), tratador_in)
+
+    # Envia pacote já montado (ex.: constantes de utils_proto)
+    def envia_pacote(self, cmd, pct, tratador_in):
+        self.log_debug("Send", HexPreguicoso(pct))
         self.send(pct)
 
         self.cmd = cmd
@@ -133,7 +155,7 @@ class ComandarCentral(TCPClientHandler, UtilsProtocolo):
     def despedida(self):
         self.log_debug("Despedindo")
         pct = self.pacote_isecnet2_bye()
-        self.log_debug("Send", self.hexprint(pct))
+        self.log_debug("Send", HexPreguicoso(pct))
         self.send(pct)
 
         self.tratador = None
@@ -162,9 +184,9 @@ class AtivarDesativarCentral(ComandarCentral):
         # byte 1: partición (0x01 = 1, 0xff = todas ou sem partición)
         # byte 2: 0x00 desarmar, 0x01 armar, 0x02 stay
         if self.partición is None:
-            payload = [ 0xff, self.subcmd ]
+            payload = bytes((0xff, self.subcmd))
         else:
-            payload = [ self.partición, self.subcmd ]
+            payload = bytes((self.partición, self.subcmd))
         self.envia_comando(0x401e, payload, self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
@@ -186,9 +208,9 @@ class DesligarSirena(ComandarCentral):
 
     def envia_comando_in(self):
         if self.partición is None:
-            payload = [ 0xff ]
+            payload = b"\xff"
         else:
-            payload = [ self.partición]
+            payload = bytes((self.partición,))
         self.envia_comando(0x4019, payload, self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
@@ -200,7 +222,7 @@ class LimparDisparo(ComandarCentral):
         super().__init__(observer, ip_addr, cport, senha, tam_senha, extra)
 
     def envia_comando_in(self):
-        self.envia_comando(0x4013, [], self.resposta_comando_in)
+        self.envia_comando(0x4013, b"", self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
         self.despedida()
@@ -215,7 +237,7 @@ class CancelarZona(ComandarCentral):
         # TODO Suportar todas as zonas (enviar 0xff)
         if not self.zona or self.zona < 1 or self.zona > 254:
             raise Exception("Zona precisa ser especificada.")
-        payload = [ self.zona - 1, 0x01 ]
+        payload = bytes((self.zona - 1, 0x01))
         self.envia_comando(0x401f, payload, self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
@@ -230,67 +252,81 @@ class ReativarZona(ComandarCentral):
         # TODO Suportar todas as zonas (enviar 0xff)
         if not self.zona or self.zona < 1 or self.zona > 254:
             raise Exception("Zona precisa ser especificada.")
-        payload = [ self.zona - 1, 0x00 ]
+        payload = bytes((self.zona - 1, 0x00))
         self.envia_comando(0x401f, payload, self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
         self.despedida()
 
 
+# Indexado por um bit (0 ou 1)
+_NAO_SIM = ("No", "Sí")
+
+# Bits do byte de estado de cada partición (bit 7 = habilitada)
+_BITS_PARTICION = (
+    (6, "Stay"),
+    (5, "Delay de saída"),
+    (4, "Listo para armar"),
+    (3, "Alarma ocurrida"),
+    (2, "En alarma"),
+    (1, "Armado modo stay"),
+    (0, "Armado"),
+)
+
+
 class SolicitarStatus(ComandarCentral):
     def __init__(self, observer, ip_addr, cport, senha, tam_senha, extra):
         super().__init__(observer, ip_addr, cport, senha, tam_senha, extra)
 
     def envia_comando_in(self):
-        self.envia_comando(0x0b4a, [], self.resposta_comando_in)
+        self.envia_pacote(0x0b4a, PACOTE_ISECNET2_STATUS, self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
         # Documentación é base 1
-        payload = [0] + payload
-        print()
-        print("*******************************************")
+        payload = [0, *payload]
+        # Linhas acumuladas e escritas de uma vez no final
+        out = ["", "*******************************************"]
         if payload[1] == 0x01:
-            print("Central AMT-8000")
+            out.append("Central AMT-8000")
         else:
-            print("Central de tipo desconocido")
-        print("Versión de firmware %d.%d.%d" % tuple(payload[2:5]))
-        print("Estado general: ")
+            out.append("Central de tipo desconocido")
+        out.append("Versión de firmware %d.%d.%d" % tuple(payload[2:5]))
+        out.append("Estado general: ")
         armado = {0x00: "Desarmado", 0x01: "Partición(es) armada(s)", 0x03: "Todas las particiones armadas"}
-        print("\t" + armado[((payload[21] >> 5) & 0x03)])
-        print("\tZonas en alarma:", (payload[21] & 0x8) and "Sí" or "No")
-        print("\tZonas canceladas:", (payload[21] & 0x10) and "Sí" or "No")
-        print("\tTodas las zonas cerradas:", (payload[21] & 0x4) and "Sí" or "No")
-        print("\tSirena:", (payload[21] & 0x2) and "Sí" or "No")
-        print("\tProblemas:", (payload[21] & 0x1) and "Sí" or "No")
-        for partición in range(0, 17):
-            habilitado = payload[22 + partición] & 0x80
-            if not habilitado:
+        geral = payload[21]
+        out.append("\t" + armado[((geral >> 5) & 0x03)])
+        out.append("\tZonas en alarma: " + _NAO_SIM[geral >> 3 & 1])
+        out.append("\tZonas canceladas: " + _NAO_SIM[geral >> 4 & 1])
+        out.append("\tTodas las zonas cerradas: " + _NAO_SIM[geral >> 2 & 1])
+        out.append("\tSirena: " + _NAO_SIM[geral >> 1 & 1])
+        out.append("\tProblemas: " + _NAO_SIM[geral & 1])
+        for partición, estado in enumerate(payload[22:39]):
+            if not estado & 0x80:
                 continue
-            print("Partición %02d:" % partición)
-            print("\tStay:", (payload[22 + partición] & 0x40) and "Sí" or "No")
-            print("\tDelay de saída:", (payload[22 + partición] & 0x20) and "Sí" or "No")
-            print("\tListo para armar:", (payload[22 + partición] & 0x10) and "Sí" or "No")
-            print("\tAlarma ocurrida:", (payload[22 + partición] & 0x08) and "Sí" or "No")
-            print("\tEn alarma:", (payload[22 + partición] & 0x04) and "Sí" or "No")
-            print("\tArmado modo stay:", (payload[22 + partición] & 0x02) and "Sí" or "No")
-            print("\tArmado:", (payload[22 + partición] & 0x01) and "Sí" or "No")
-        print("Zonas abiertas:", self.bits_para_numeros(payload[39:47]))
-        print("Zonas en alarma:", self.bits_para_numeros(payload[47:55]))
-        # print("Zonas ativas:", self.bits_para_numeros(payload[55:63], inverso=True))
-        print("Zonas en bypass:", self.bits_para_numeros(payload[55:63]))
-        print("Sirenas encendidas:", self.bits_para_numeros(payload[63:65]))
+            out.append("Partición %02d:" % partición)
+            for bit, nome in _BITS_PARTICION:
+                out.append("\t%s: %s" % (nome, _NAO_SIM[estado >> bit & 1]))
+        out.append("Zonas abiertas: " + self.bits_para_numeros(payload[39:47]))
+        out.append("Zonas en alarma: " + self.bits_para_numeros(payload[47:55]))
+        # out.append("Zonas ativas: " + self.bits_para_numeros(payload[55:63], inverso=True))
+        out.append("Zonas en bypass: " + self.bits_para_numeros(payload[55:63]))
+        out.append("Sirenas encendidas: " + self.bits_para_numeros(payload[63:65]))
 
         # TODO interpretar mais campos
-        print("*******************************************")
-        print()
+        out.append("*******************************************")
+        out.append("")
+        sys.stdout.write("\n".join(out) + "\n")
 
         self.despedida()
 
     def bits_para_numeros(self, octetos, inverso=False):
+        # Bitmap inteiro como um só int (octeto 0 = bits menos significativos)
+        n = int.from_bytes(bytes(octetos), "little")
+        if inverso:
+            n ^= (1 << (8 * len(octetos))) - 1
         lista = []
-        for i, octeto in enumerate(octetos):
-            for j in range(0, 8):
-                bit = octeto & (1 << j)
-                if (bit and not inverso) or (not bit and inverso):
-                    lista.append("%d" % (1 + j + i * 8))
+        while n:
+            bit = n & -n
+            lista.append("%d" % bit.bit_length())
+            n ^= bit
         return ", ".join(lista)
@@ -64,6 +64,11 @@ class Log:
 
     @staticmethod
     def log(level, *msg):
+        # Descarta antes de formatar: os argumentos podem ter str() caro (hexdumps)
+        envia_mail = level <= Log.mail_level and Log.mail_from != 'None' and Log.mail_to != 'None'
+        if level > Log.log_level and not envia_mail:
+            return
+
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         msgw = now
         for item in msg:
@@ -80,7 +85,7 @@ class Log:
                 f.write("\r\n")
                 f.close()
 
-        if level <= Log.mail_level and Log.mail_from != 'None' and Log.mail_to != 'None':
+        if envia_mail:
             Log.mail(msgw)
 
     @staticmethod
@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
 
+import struct
 import time
+from concurrent.futures import ThreadPoolExecutor
+from .myeventloop import Log
 from .utils_proto import *
 from .comandos import ComandarCentral
 
+# Cabeçalho da resposta 0x0bb0: índice (be16), foto, nr fotos, fragmento, nr fragmentos
+_FRAG_HDR = struct.Struct(">HBBBB")
+# Pedido 0x0bb0: índice (be16), foto, fragmento
+_FRAG_REQ = struct.Struct(">HBB")
+
+# Gravação dos JPEG fora do laço de eventos; um só trabalhador mantém a ordem
+_POOL_GRAVACAO = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grava_foto")
+
+def _grava_arquivo(archivo, jpeg):
+    # Escrita única do buffer já montado: sem buffer intermediário do io
+    try:
+        with open(archivo, "wb", buffering=0) as f:
+            f.write(jpeg)
+    except OSError as e:
+        Log.warn("Conexión foto: falló grabación de", archivo, e)
+        return False
+    return True
+
 # Agente que obtiene fotos de um evento de sensor com câmera
 
 class ObtemFotosDeEvento(ComandarCentral):
+    # Pedidos de fragmento em voo ao mesmo tempo (1 = um RTT por fragmento)
+    janela_fragmentos = 4
+
     def __init__(self, ip_addr, cport, indice, nrfoto, senha, tam_senha, observer, folder):
         extra = [indice, nrfoto]
         super().__init__(observer, ip_addr, cport, senha, tam_senha, extra)
         self.log_info("Iniciando obtención de foto %d:%d" % (indice, nrfoto))
+        self.ip_addr = ip_addr
         self.indice = indice
         self.nrfoto = nrfoto
         self.archivo = ""
+        self.gravacao = None # Future da gravação do arquivo
         self.folder = folder
 
         # Se destruído com esse status, reporta erro fatal
@@ -25,16 +51,36 @@ class ObtemFotosDeEvento(ComandarCentral):
     def destroyed_callback(self):
         # Informa observador sobre status final da tarefa
         self.observer.resultado_foto(self.indice, self.nrfoto, \
-                                     self.status, self.archivo)
+                                     self.status, self.archivo, gravacao=self.gravacao)
 
     def envia_comando_in(self):
-        self.fragmento_corrente = 1 # Fragmento 1 sempre existe
-        self.jpeg_corrente = []
-        self.obtiene_fragmento_foto()
+        self.fragmento_corrente = 1 # Próximo fragmento a juntar ao JPEG
+        self.proximo_fragmento = 1 # Próximo fragmento a pedir
+        self.nr_fragmentos = 1 # Fragmento 1 sempre existe; total vem na resposta
+        self.fragmentos_pendentes = set()
+        self.fragmentos_fora_de_ordem = {}
+        self.jpeg_corrente = bytearray()
+        self.pede_fragmentos()
+
+    def pede_fragmentos(self):
+        while self.proximo_fragmento <= self.nr_fragmentos and \
+                len(self.fragmentos_pendentes) < self.janela_fragmentos:
+            self.obtiene_fragmento_foto(self.proximo_fragmento)
+            self.fragmentos_pendentes.add(self.proximo_fragmento)
+            self.proximo_fragmento += 1
+
+    def log_recv(self, latest):
+        # Fragmentos JPEG: só o tamanho, sem hexdump do conteúdo. Com a janela
+        # um recv pode trazer várias respostas; o número de cada fragmento é
+        # logado em resposta_comando_in
+        if self.tratador != self.resposta_comando:
+            super().log_recv(latest)
+            return
+        self.log_debug("Recv frag len", len(latest))
 
-    def obtiene_fragmento_foto(self):
-        self.log_debug("Conexión foto: obteniendo fragmento %d" % self.fragmento_corrente)
-        payload = self.be16(self.indice) + [ self.nrfoto, self.fragmento_corrente ]
+    def obtiene_fragmento_foto(self, fragmento):
+        self.log_debug("Conexión foto: obteniendo fragmento %d" % fragmento)
+        payload = _FRAG_REQ.pack(self.indice, self.nrfoto, fragmento)
         self.envia_comando(0x0bb0, payload, self.resposta_comando_in)
 
     def resposta_comando_in(self, payload):
@@ -43,14 +89,8 @@ class ObtemFotosDeEvento(ComandarCentral):
             self.destroy()
             return
 
-        self.log_debug("Conexión foto: respuesta fragmento %d" % self.fragmento_corrente)
-
-        indice = self.parse_be16(payload[0:2])
-        foto = payload[2]
-        nr_fotos = payload[3]
-        fragmento = payload[4]
-        nr_fragmentos = payload[5]
-        fragmento_jpeg = payload[6:]
+        indice, foto, nr_fotos, fragmento, nr_fragmentos = _FRAG_HDR.unpack_from(payload)
+        fragmento_jpeg = memoryview(payload)[_FRAG_HDR.size:]
 
         if indice != self.indice:
             self.log_info("Conexión foto: índice inválido")
@@ -62,26 +102,53 @@ class ObtemFotosDeEvento(ComandarCentral):
             self.destroy()
             return
 
-        if fragmento != self.fragmento_corrente:
+        if fragmento not in self.fragmentos_pendentes:
             self.log_info("Conexión foto: frag corriente inválido")
             self.destroy()
             return
 
-        self.jpeg_corrente += fragmento_jpeg
+        self.log_debug("Conexión foto: respuesta fragmento %d" % fragmento)
+        self.fragmentos_pendentes.discard(fragmento)
+        self.nr_fragmentos = nr_fragmentos
 
-        if fragmento < nr_fragmentos:
+        # Respostas podem chegar fora de ordem; o JPEG é montado em sequência
+        # num só buffer contíguo
+        self.fragmentos_fora_de_ordem[fragmento] = fragmento_jpeg
+        while self.fragmento_corrente in self.fragmentos_fora_de_ordem:
+            self.jpeg_corrente.extend(self.fragmentos_fora_de_ordem.pop(self.fragmento_corrente))
             self.fragmento_corrente += 1
-            self.obtiene_fragmento_foto()
+
+        if self.fragmento_corrente <= nr_fragmentos:
+            self.pede_fragmentos()
+            if not self.fragmentos_pendentes:
+                self.log_info("Conexión foto: fragmentos faltantes")
+                self.destroy()
+                return
+            # Nem toda resposta gera pedido novo; adiar o prazo pelo progresso
+            self.conn_timeout.restart()
             return
 
         self.log_info("Conexión foto: guardando imagen")
         self.archivo = self.folder + "/" + \
                 "imagen.%d.%d.%.6f.jpeg" % (indice, foto, time.time())
-        f = open(self.archivo, "wb")
-        f.write(bytearray(self.jpeg_corrente))
-        f.close()
+        # Disco (ex.: cartão SD) pode ser lento: grava em outro thread e segue
+        self.gravacao = _POOL_GRAVACAO.submit(_grava_arquivo, self.archivo, self.jpeg_corrente)
+
+        # Próxima foto da cola na mesma central reaproveita esta conexión
+        # já autenticada em vez de despedir e reconectar
+        proxima = self.observer.proxima_foto(self.ip_addr)
+        if proxima is None:
+            self.despedida()
+            return
 
-        self.despedida()
+        self.observer.resultado_foto(self.indice, self.nrfoto, 0, self.archivo, \
+                                     continua=True, gravacao=self.gravacao)
+        self.indice, self.nrfoto = proxima
+        self.log_info("Continuando con foto %d:%d" % (self.indice, self.nrfoto))
+        self.archivo = ""
+        self.gravacao = None
+        self.status = 2
+        self.envia_comando_in()
 
     # Motivos NAK (nem todos se aplicam a download de fotos):
     # 00    Mensagem Ok (Por que NAK então? ACK = cmd 0xf0fe)
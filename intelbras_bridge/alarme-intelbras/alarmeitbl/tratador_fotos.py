@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 
 import os
-from .myeventloop import Timeout, Log
-from .obtiene_fotos import *
+import shlex
+import subprocess
+from collections import deque
+from .myeventloop import Handler, Timeout, Log
+from .obtem_fotos import *
 
 # Tratador de fotos obtidas via eventos 0xb5. Desacoplado do tratador 
 # principal pois usa conexiones separadas, e as fotos ficam armazenadas
@@ -13,22 +16,55 @@ from .obtiene_fotos import *
 # armazenados num banco de dados local, para que no se percam quando
 # o programa é reiniciado.
 
+# Leva resultados do thread de gravação para o laço de eventos: o thread
+# enfileira e escreve um byte no pipe; o laço lê e chama o callback.
+# Timeout e a cola de fotos só são manipulados no thread do laço.
+class AvisoDeGravacao(Handler):
+    def __init__(self, callback):
+        fd_leitura, self.fd_escrita = os.pipe()
+        os.set_blocking(fd_leitura, False)
+        super().__init__("aviso_gravacao", os.fdopen(fd_leitura, "rb", buffering=0), (OSError,))
+        self.callback = callback
+        self.resultados = deque()
+
+    # Chamado de qualquer thread
+    def avisar(self, *resultado):
+        self.resultados.append(resultado)
+        os.write(self.fd_escrita, b"\0")
+
+    def read_callback(self):
+        self.fd.read(4096)
+        while self.resultados:
+            self.callback(*self.resultados.popleft())
+
+    def destroyed_callback(self):
+        os.close(self.fd_escrita)
+
+
 class TratadorDeFotos:
     def __init__(self, gancho, folder, caddr, cport, senha, tam_senha):
         self.gancho = gancho
+        # argv do gancho separado uma vez; ":" (no-op do shell) desativa o gancho
+        self.gancho_argv = shlex.split(gancho or "")
+        if self.gancho_argv == [":"]:
+            self.gancho_argv = []
         self.folder = folder
         self.caddr = caddr
         self.cport = cport
         self.senha = senha
         self.tam_senha = tam_senha
-        self.cola = [] # [dirección IP, indice, nr. foto, intentos restantes]
+        self.cola = deque() # [dirección IP, indice, nr. foto, intentos restantes]
         self.task = None
+        self.aviso = None # AvisoDeGravacao, criado na primeira gravação
 
     # Recebe nova foto de algum Tratador para a cola
     def enfileirar(self, ip_addr_cli, indice, nrfoto):
         if self.tam_senha <= 0:
             return
         self.cola.append([ip_addr_cli, indice, nrfoto, 10])
+        self.arma_task()
+
+    def arma_task(self):
         if not self.task:
             # Fotos de sensor 8000 demoram para gravar (NAK 0x28 = foto no gravada)
             self.task = Timeout.new("trata_foto", 20, self.obtiene_foto)
@@ -43,11 +79,7 @@ class TratadorDeFotos:
             return
 
         ip_addr_cli, indice, nrfoto, intentos = self.cola[0]
-
-        # Usar dirección da central detectada ou manualmente especificado?
-        ip_addr = ip_addr_cli
-        if self.caddr != "auto":
-            ip_addr = self.caddr
+        ip_addr = self.endereco_central(ip_addr_cli)
 
         Log.info("tratador de fotos: obtendo %s:%d:%d intentos %d" % \
                       (ip_addr, indice, nrfoto, intentos))
@@ -55,27 +87,75 @@ class TratadorDeFotos:
         ObtemFotosDeEvento(ip_addr, self.cport, indice, nrfoto, \
                             self.senha, self.tam_senha, self, self.folder)
 
+    # Usar dirección da central detectada ou manualmente especificado?
+    def endereco_central(self, ip_addr_cli):
+        if self.caddr != "auto":
+            return self.caddr
+        return ip_addr_cli
+
+    # Chamado por ObtemFotosDeEvento com a foto corrente (cola[0]) já gravada:
+    # retorna (indice, nrfoto) da seguinte se for da mesma central, ou None
+    def proxima_foto(self, ip_addr):
+        if len(self.cola) < 2:
+            return None
+        ip_addr_cli, indice, nrfoto, intentos = self.cola[1]
+        if self.endereco_central(ip_addr_cli) != ip_addr:
+            return None
+        return indice, nrfoto
+
     def msg_para_gancho_archivo(self, archivo):
-        p = os.popen(self.gancho + " " + archivo, 'w')
-        p.close()
+        # Sem shell: nome do arquivo vai como argumento, sem reinterpretação
+        try:
+            subprocess.Popen(self.gancho_argv + [archivo], stdin=subprocess.DEVNULL, close_fds=True)
+        except OSError as e:
+            Log.warn("tratador de fotos: gancho falhou", e)
 
-    # observer chamado quando ObtemFotosDeEvento finaliza
-    def resultado_foto(self, indice, nrfoto, status, archivo):
-        if status == 0:
-            Log.info("Fotos indice %d:%d: sucesso" % (indice, nrfoto))
-            Log.info("Arquivo de foto %s" % archivo)
-            if self.gancho:
+    # Chamado no laço de eventos via AvisoDeGravacao. Falha na escrita: a foto
+    # continua na central, volta para a cola com uma tentativa a menos; a cola
+    # pode já ter esvaziado (disco lento) e a tarefa precisa ser rearmada
+    def gravacao_concluida(self, ok, entrada, archivo):
+        ip_addr_cli, indice, nrfoto, intentos = entrada
+        if ok:
+            Log.info("Fotos indice %d:%d: sucesso, arquivo %s" % (indice, nrfoto, archivo))
+            if self.gancho_argv:
                 self.msg_para_gancho_archivo(archivo)
-            del self.cola[0]
+            return
+        if intentos <= 1:
+            Log.error("Fotos indice %d:%d: falha ao gravar %s, intentos esgotadas" % \
+                      (indice, nrfoto, archivo))
+            return
+        Log.error("Fotos indice %d:%d: falha ao gravar %s, nova tentativa" % \
+                  (indice, nrfoto, archivo))
+        self.cola.append([ip_addr_cli, indice, nrfoto, intentos - 1])
+        self.arma_task()
+
+    # observer chamado quando ObtemFotosDeEvento finaliza, ou com continua=True
+    # quando segue para a próxima foto na mesma conexión. gravacao é o Future
+    # da escrita do arquivo, que pode ainda estar em andamento
+    def resultado_foto(self, indice, nrfoto, status, archivo, continua=False, gravacao=None):
+        if status == 0:
+            Log.info("Fotos indice %d:%d: recebida" % (indice, nrfoto))
+            entrada = self.cola.popleft()
+            if gravacao is None:
+                Log.info("Arquivo de foto %s" % archivo)
+                if self.gancho_argv:
+                    self.msg_para_gancho_archivo(archivo)
+            else:
+                # Sucesso e gancho só depois do arquivo completo no disco
+                if self.aviso is None:
+                    self.aviso = AvisoDeGravacao(self.gravacao_concluida)
+                aviso = self.aviso
+                gravacao.add_done_callback(lambda f: aviso.avisar(f.result(), entrada, archivo))
         elif status == 2:
             Log.info("Fotos indice %d:%d: erro fatal" % (indice, nrfoto))
-            del self.cola[0]
+            self.cola.popleft()
         else:
             self.cola[0][3] -= 1
             if self.cola[0][3] <= 0:
                 Log.info("Fotos indice %d:%d: intentos esgotadas" % (indice, nrfoto))
-                del self.cola[0]
+                self.cola.popleft()
             else:
                 Log.info("Fotos indice %d:%d: erro temporario" % (indice, nrfoto))
 
-        self.task.restart()
+        if not continua:
+            self.task.restart()
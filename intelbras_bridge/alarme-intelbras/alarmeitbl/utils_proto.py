@@ -1,20 +1,37 @@
 #!/usr/bin/env python3
 
+import functools
+import operator
+import struct
 from .myeventloop import Log
 
+# Cabeçalho ISECNet2: dst_id, src_id, comprimento (cmd + payload), cmd
+_CABECALHO_ISECNET2 = struct.Struct(">HHHH")
+_BE16 = struct.Struct(">H")
+
+def _hexprint(buf):
+    # bytes.hex() formata em C; o separador só aceita um caractere
+    return bytes(buf).hex(" ").replace(" ", ", ")
+
+# Hexdump formatado só quando o log de fato é emitido (str() no Log.log)
+class HexPreguicoso:
+    __slots__ = ("buf",)
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def __str__(self):
+        return _hexprint(self.buf)
+
 class UtilsProtocolo:
     def hexprint(self, buf):
-        return ", ".join(["%02x" % n for n in buf])
+        return _hexprint(buf)
 
     # Calcula checksum de frame longo
     # Presume que "dados" contém o byte de comprimento mas no contém o byte de checksum
     def checksum(self, dados):
-        checksum = 0
-        for n in dados:
-            checksum ^= n
-        checksum ^= 0xff
-        checksum &= 0xff
-        return checksum
+        # XOR de todos os octetos feito em C por reduce
+        return (functools.reduce(operator.xor, dados, 0) ^ 0xff) & 0xff
 
     # Decodifica número no formato "Contact ID"
     # Retorna -1 se aparenta estar corrompido
@@ -64,32 +81,36 @@ class UtilsProtocolo:
             posicao *= 100
         return numero
     
-    # Codifica um número de 16 bits em 2 octetos
+    # Codifica um número de 16 bits em 2 octetos (bytes)
     def be16(self, n):
-        return [ n // 256, n % 256 ]
+        return _BE16.pack(n)
     
-    # Decodifica um buffer de 2 octetos para inteiro de 16 bits
-    def parse_be16(self, buf):
-        return buf[0] * 256 + buf[1]
+    # Decodifica 2 octetos a partir de offset para inteiro de 16 bits
+    def parse_be16(self, buf, offset=0):
+        return _BE16.unpack_from(buf, offset)[0]
 
+    # payload: bytes; devolve o pacote como bytes
     def pacote_isecnet2(self, cmd, payload):
         # ID da central, sempre zero
-        dst_id = self.be16(0x0000)
+        dst_id = 0x0000
         # ID nosso, pode ser qualquer número, devolvido nos pacotes de retorno
         # Possivelmente uma relíquia de canais seriais onde múltiplos receptores
         # ouvem as mensajes, e dst_id ajudaria a identificar o recipiente
-        src_id = self.be16(0x8fff)
-        length = self.be16(len(payload) + 2)
-        cmd_enc = self.be16(cmd)
-        pacote = dst_id + src_id + length + cmd_enc + payload
-        pacote = pacote + [ self.checksum(pacote) ]
-        return pacote
+        src_id = 0x8fff
+        pacote = bytearray(_CABECALHO_ISECNET2.pack(dst_id, src_id, len(payload) + 2, cmd))
+        pacote += payload
+        pacote.append(self.checksum(pacote))
+        return bytes(pacote)
 
     def pacote_isecnet2_auth(self, senha, tam_senha):
+        # Na prática só uma senha é usada: pacote montado uma vez e reutilizado
+        return _pacote_auth(senha, tam_senha)
+
+    def monta_pacote_isecnet2_auth(self, senha, tam_senha):
         # 0x02 software de monitoramento, 0x03 mobile app
-        sw_type = [ 0x02 ]
-        senha = self.contact_id_encode(senha, tam_senha)
-        sw_ver = [ 0x10 ]  # nibble.nibble (0x10 = 1.0)
+        sw_type = b"\x02"
+        senha = bytes(self.contact_id_encode(senha, tam_senha))
+        sw_ver = b"\x10"  # nibble.nibble (0x10 = 1.0)
         payload = sw_type + senha + sw_ver
         return self.pacote_isecnet2(0xf0f0, payload)
 
@@ -99,14 +120,14 @@ class UtilsProtocolo:
         # Um pacote tem tamanho mínimo 9 (src_id, dst_id, len, cmd, checksum)
         if len(data) < 9:
             return 0
-        compr = 6 + self.parse_be16(data[4:6]) + 1
+        compr = 6 + self.parse_be16(data, 4) + 1
         if len(data) < compr:
             return 0
         return compr
 
     # Consiste um pacote do protocolo ISECNet2
     def pacote_isecnet2_correto(self, pct):
-        compr_liquido = self.parse_be16(pct[4:6])
+        compr_liquido = self.parse_be16(pct, 4)
         if compr_liquido < 2:
             # Um pacote deveria ter no minimo um comando
             return False
@@ -116,12 +137,21 @@ class UtilsProtocolo:
     
     # Interpreta um pacote do protocolo ISECNet2
     def pacote_isecnet2_parse(self, pct):
-        compr_liquido = self.parse_be16(pct[4:6])
+        compr_liquido = self.parse_be16(pct, 4)
         compr_payload = compr_liquido - 2
-        cmd = self.parse_be16(pct[6:8])
+        cmd = self.parse_be16(pct, 6)
         payload = pct[8:8+compr_payload]
         return cmd, payload
 
     def pacote_isecnet2_bye(self):
-        return self.pacote_isecnet2(0xf0f1, [])
+        return PACOTE_ISECNET2_BYE
+
+# Pacotes fixos montados uma só vez na importação (bytes imutáveis)
+_utils = UtilsProtocolo()
+PACOTE_ISECNET2_BYE = _utils.pacote_isecnet2(0xf0f1, b"")
+PACOTE_ISECNET2_STATUS = _utils.pacote_isecnet2(0x0b4a, b"")
+
+@functools.lru_cache(maxsize=4)
+def _pacote_auth(senha, tam_senha):
+    return _utils.monta_pacote_isecnet2_auth(senha, tam_senha)
 
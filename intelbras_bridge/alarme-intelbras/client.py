@@ -1,13 +1,22 @@
 """Module for amt-8000 communication."""
 
-import socket
+import functools
+import itertools
 import logging
-from typing import Dict, Any, List
+import operator
+import socket
+import struct
+from typing import Dict, Any, List, Tuple
 
 LOGGER = logging.getLogger(__name__)
 
 timeout = 8  # Set the timeout to 8 seconds to allow slower panel responses
 
+# Keepalive tuning options; not every platform exposes them (Linux does).
+KEEPALIVE_IDLE_OPTION = getattr(socket, "TCP_KEEPIDLE", None)
+KEEPALIVE_INTERVAL_OPTION = getattr(socket, "TCP_KEEPINTVL", None)
+KEEPALIVE_COUNT_OPTION = getattr(socket, "TCP_KEEPCNT", None)
+
 dst_id = [0x00, 0x00]
 our_id = [0x8F, 0xFF]
 commands = {
@@ -21,6 +30,28 @@ commands = {
 # Constantes para el procesamiento de zonas (offset de la versión que funciona)
 ZONE_STATUS_PAYLOAD_OFFSET = 22 # The first zone byte within the payload (from the working fork)
 MAX_ZONES = 64 # Maximum number of zones that can be read (8 bytes * 8 bits)
+FRAME_HEADER_LENGTH = 8 # dst_id, our_id, length and command, 2 bytes each
+
+# Zone states of the 8 zones in each possible byte value, least significant bit first
+# Zone state indexed by its bit value
+_OPEN_CLOSED = ("closed", "open")
+_ZONE_STATES_BY_BYTE = tuple(
+    tuple(_OPEN_CLOSED[(value >> bit) & 1] for bit in range(8)) for value in range(256)
+)
+TAMPER_BIT = 0x02 # Bit 1 of payload byte 71
+# String zone keys for the zone-keyed dicts, indexed by zone number (index 0 unused)
+_ZONE_KEYS = tuple(str(zone_number) for zone_number in range(MAX_ZONES + 1))
+
+class _LazyHex:
+    """Hex dump for debug logs, only formatted if the record is emitted."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return self.data.hex()
 
 def split_into_octets(n):
     """Splits an integer into high and low bytes."""
@@ -33,33 +64,65 @@ def split_into_octets(n):
 
 def calculate_checksum(buffer):
     """Calculate a checksum for a given array of bytes."""
-    checksum = 0
-    for value in buffer:
-        checksum ^= value
-    checksum ^= 0xFF
-    checksum &= 0xFF
-    return checksum
+    # The XOR reduction runs in C (reduce + operator.xor), not per byte in Python.
+    return (functools.reduce(operator.xor, buffer, 0) ^ 0xFF) & 0xFF
+
+def _verify_frame(frame):
+    """Check a complete frame: the checksum over data plus checksum byte is zero."""
+    return calculate_checksum(frame) == 0
 
 def merge_octets(buf):
     """Merge octets."""
     return buf[0] * 256 + buf[1]
 
+# dst_id, our_id, length (command + parameters), command
+_FRAME_HEADER = struct.Struct(">HHHH")
+# device type, 6 password digits, software version
+_AUTH_PARAMS = struct.Struct(">B6sB")
+
+def _frame_prefix(command, params_length):
+    """Build the fixed header and command bytes of a frame with params_length parameter bytes."""
+    return _FRAME_HEADER.pack(
+        merge_octets(dst_id), merge_octets(our_id), len(command) + params_length, merge_octets(command)
+    )
+
+def _finish_frame(prefix, params=b""):
+    """Append the parameters and the checksum to a prebuilt frame prefix."""
+    frame = bytearray(prefix)
+    frame += bytes(params)
+    frame.append(calculate_checksum(frame))
+    return bytes(frame)
+
+@functools.lru_cache(maxsize=32)
+def _command_frame(prefix, params):
+    """Memoized _finish_frame for commands whose few parameter values repeat (arm, disarm, panic)."""
+    return _finish_frame(prefix, params)
+
+# Frames built once at import: fixed commands are sent as-is, the others only
+# append their parameters and checksum to a prebuilt prefix.
+_STATUS_FRAME = _finish_frame(_frame_prefix(commands["status"], 0))
+_PAIRED_SENSORS_FRAME = _finish_frame(_frame_prefix(commands["paired_sensors"], 0))
+_AUTH_PREFIX = _frame_prefix(commands["auth"], _AUTH_PARAMS.size)
+_ARM_DISARM_PREFIX = _frame_prefix(commands["arm_disarm"], 2)  # partition, arm/disarm
+_PANIC_PREFIX = _frame_prefix(commands["panic"], 1)  # panic type
+# bytes.translate table mapping ASCII "0".."9" to 0..9
+_ASCII_DIGIT_VALUES = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+# Status codes decoded with one dict lookup instead of if chains
+_BATTERY_STATUS = {0x01: "dead", 0x02: "low", 0x03: "middle", 0x04: "full"}
+_ARMING_STATUS = {0x00: "disarmed", 0x01: "partial_armed", 0x03: "armed_away"}
+
 def battery_status_for(resp):
     """Retrieve the battery status."""
     if len(resp) <= 134:
         LOGGER.debug("Payload too short for battery status. Length: %d", len(resp))
         return "unknown"
     batt = resp[134]
-    if batt == 0x01:
-        return "dead"
-    if batt == 0x02:
-        return "low"
-    if batt == 0x03:
-        return "middle"
-    if batt == 0x04:
-        return "full"
-    LOGGER.debug("Unknown battery status code: 0x%02x", batt)
-    return "unknown"
+    battery_status = _BATTERY_STATUS.get(batt)
+    if battery_status is None:
+        LOGGER.debug("Unknown battery status code: 0x%02x", batt)
+        return "unknown"
+    return battery_status
 
 def get_status(payload):
     """Retrieve the current status from a given array of bytes."""
@@ -67,24 +130,19 @@ def get_status(payload):
         LOGGER.debug("Payload too short for general status. Length: %d", len(payload))
         return "unknown"
     status = (payload[20] >> 5) & 0x03
-    if status == 0x00:
-        return "disarmed"
-    if status == 0x01:
-        return "partial_armed"
-    if status == 0x03:
-        return "armed_away"
-    LOGGER.debug("Unknown arming status code: 0x%02x", status)
-    return "unknown"
-
-def get_zones_status_from_payload(payload: bytearray, num_zones: int = MAX_ZONES) -> Dict[str, str]:
+    arming_status = _ARMING_STATUS.get(status)
+    if arming_status is None:
+        LOGGER.debug("Unknown arming status code: 0x%02x", status)
+        return "unknown"
+    return arming_status
+
+def get_zones_mask_from_payload(payload: bytes, num_zones: int = MAX_ZONES) -> Tuple[int, int]:
     """
-    Decodes the zone status from the payload.
+    Decodes the zone status from the payload as a bitmask.
     The zone status bytes start at ZONE_STATUS_PAYLOAD_OFFSET (22) in the status payload.
-    Each bit represents a zone (0 = closed, 1 = open/faulted).
-    Returns a dictionary of zone_id (str) to "open" or "closed".
+    Each bit represents a zone (0 = closed, 1 = open/faulted), zone 1 in bit 0.
+    Returns (mask, count), where count is the number of zones present in the payload.
     """
-    zones_status_dict = {}
-    
     required_bytes_for_zones = (num_zones + 7) // 8
     
     if len(payload) < ZONE_STATUS_PAYLOAD_OFFSET + required_bytes_for_zones:
@@ -93,24 +151,34 @@ def get_zones_status_from_payload(payload: bytearray, num_zones: int = MAX_ZONES
     else:
         bytes_to_process = payload[ZONE_STATUS_PAYLOAD_OFFSET : ZONE_STATUS_PAYLOAD_OFFSET + required_bytes_for_zones]
 
-    zone_current_idx = 0
-    for byte_val in bytes_to_process:
-        for bit_index in range(8):
-            if zone_current_idx < num_zones:
-                zone_number = zone_current_idx + 1
-                is_open = bool(byte_val & (1 << bit_index))
-                zones_status_dict[str(zone_number)] = "open" if is_open else "closed"
-                zone_current_idx += 1
-            else:
-                break
-        if zone_current_idx >= num_zones:
-            break
-
-    LOGGER.debug(f"Decoded zones status: {zones_status_dict}")
+    count = min(num_zones, len(bytes_to_process) * 8)
+    mask = int.from_bytes(bytes_to_process, "little") & ((1 << count) - 1)
+    return mask, count
+
+def zone_open(mask: int, zone_id: int) -> bool:
+    """Return True if zone_id (1-based) is open in a zone bitmask."""
+    return bool(mask >> (zone_id - 1) & 1)
+
+def zones_dict(mask: int, count: int) -> Dict[str, str]:
+    """Expand a zone bitmask into a dictionary of zone_id (str) to "open" or "closed"."""
+    # Table lookup per byte; zip stops at count.
+    mask_bytes = mask.to_bytes((count + 7) // 8, "little")
+    states = itertools.chain.from_iterable(map(_ZONE_STATES_BY_BYTE.__getitem__, mask_bytes))
+    # Same str keys as get_paired_sensors
+    keys = _ZONE_KEYS[1:count + 1] if count <= MAX_ZONES else map(str, range(1, count + 1))
+    return dict(zip(keys, states))
+
+def get_zones_status_from_payload(payload: bytes, num_zones: int = MAX_ZONES) -> Dict[str, str]:
+    """
+    Decodes the zone status from the payload.
+    Returns a dictionary of zone_id (str) to "open" or "closed".
+    """
+    zones_status_dict = zones_dict(*get_zones_mask_from_payload(payload, num_zones))
+    LOGGER.debug("Decoded zones status: %s", zones_status_dict)
     return zones_status_dict
 
 
-def build_status(data: bytearray) -> Dict[str, Any]:
+def build_status(data: bytes) -> Dict[str, Any]:
     """Build the amt-8000 status from a given array of bytes, including zone status."""
     if len(data) < 8:
         LOGGER.error("Received status data is too short (less than 8 bytes). Data: %s", data.hex())
@@ -123,34 +191,20 @@ def build_status(data: bytearray) -> Dict[str, Any]:
             "siren": False,
             "batteryStatus": "unknown",
             "tamper": False,
-            "zones": {}
-        }
-
-    length_bytes = data[4:6]
-    if len(length_bytes) < 2:
-        LOGGER.error("Length bytes are missing or insufficient in status data. Data: %s", data.hex())
-        return {
-            "model": "Unknown",
-            "version": "Unknown",
-            "status": "unknown",
-            "zonesFiring": False,
-            "zonesClosed": False,
-            "siren": False,
-            "batteryStatus": "unknown",
-            "tamper": False,
-            "zones": {}
+            "zones_mask": 0,
+            "zones_count": 0
         }
 
-    expected_payload_length = merge_octets(data[4:6])
+    # Zero-copy view: the length field and the payload are read without slicing copies.
+    view = memoryview(data)
+    expected_payload_length = (view[4] << 8) | view[5]
 
     if len(data) < 8 + expected_payload_length:
         LOGGER.debug("Received data is shorter than indicated length. Expected: %d, Received: %d. Data: %s",
-                        8 + expected_payload_length, len(data), data.hex())
-        payload = data[8:]
-    else:
-        payload = data[8 : 8 + expected_payload_length]
+                        8 + expected_payload_length, len(data), _LazyHex(data))
+    payload = view[8 : 8 + expected_payload_length]
 
-    LOGGER.debug("Raw payload for status: %s", payload.hex())
+    LOGGER.debug("Raw payload for status: %s", _LazyHex(payload))
 
     status_data = {}
 
@@ -162,27 +216,29 @@ def build_status(data: bytearray) -> Dict[str, Any]:
     if len(payload) > 3:
         status_data["version"] = f"{payload[1]}.{payload[2]}.{payload[3]}"
     
-    status_data["status"] = "unknown"
-    status_data["zonesFiring"] = False
-    status_data["zonesClosed"] = False
-    status_data["siren"] = False
     if len(payload) > 20:
-        status_data["status"] = get_status(payload)
-        status_data["zonesFiring"] = (payload[20] & 0x8) > 0
-        status_data["zonesClosed"] = (payload[20] & 0x4) > 0
-        status_data["siren"] = (payload[20] & 0x2) > 0
+        # One read of the flags byte: bits 5-6 arming status, 3 firing, 2 closed, 1 siren
+        flags = payload[20]
+        status_data.update(
+            status=get_status(payload),
+            zonesFiring=bool(flags & 0x8),
+            zonesClosed=bool(flags & 0x4),
+            siren=bool(flags & 0x2),
+        )
     else:
+        status_data.update(status="unknown", zonesFiring=False, zonesClosed=False, siren=False)
         LOGGER.debug("Payload too short for full status bits. Length: %d", len(payload))
 
     status_data["batteryStatus"] = battery_status_for(payload)
 
     status_data["tamper"] = False
     if len(payload) > 71:
-        status_data["tamper"] = (payload[71] & (1 << 0x01)) > 0
+        status_data["tamper"] = bool(payload[71] & TAMPER_BIT)
     else:
         LOGGER.debug("Payload too short for tamper status. Length: %d", len(payload))
 
-    status_data["zones"] = get_zones_status_from_payload(payload)
+    # Zones stay a bitmask; zone_open()/zones_dict() read it on demand.
+    status_data["zones_mask"], status_data["zones_count"] = get_zones_mask_from_payload(payload)
 
     LOGGER.debug("Decoded status: %s", status_data)
     return status_data
@@ -217,6 +273,14 @@ class Client:
         self.software_version = software_version
         self._socket = None # Usar un atributo privado para el socket
         self._is_connected = False # Nuevo flag para el estado de la conexión persistente
+        # Buffer de recepción reutilizado en cada comando (recv_into en lugar de recv)
+        self._recv_buf = bytearray(1024)
+        self._recv_view = memoryview(self._recv_buf)
+
+    @property
+    def is_connected(self):
+        """Return True while the persistent socket is open."""
+        return self._is_connected and self._socket is not None
 
     def connect(self):
         """Establish a persistent socket connection."""
@@ -238,14 +302,33 @@ class Client:
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._socket.settimeout(timeout)
             self._socket.connect((self.host, self.port))
+            self._configure_socket(self._socket)
             self._is_connected = True
             LOGGER.info("Persistent connection established to %s:%d.", self.host, self.port)
             return True
         except (socket.timeout, ConnectionRefusedError, OSError) as e:
             self._is_connected = False
+            # Cerrar antes de soltarlo: el fallo puede llegar con el socket ya creado
+            if self._socket:
+                try:
+                    self._socket.close()
+                except OSError as close_error:
+                    LOGGER.debug("Error closing failed socket: %s", close_error)
             self._socket = None # Limpiar el socket en caso de fallo
             raise CommunicationError(f"Failed to connect to {self.host}:{self.port}: {e}")
 
+    @staticmethod
+    def _configure_socket(sock):
+        """Disable Nagle and enable keepalive on the persistent connection."""
+        # Las tramas son de pocos bytes y cada una espera respuesta: sin Nagle
+        # salen de inmediato en lugar de esperar al ACK retardado.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Keepalive para detectar una central caída mientras la conexión está ociosa.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in ((KEEPALIVE_IDLE_OPTION, 30), (KEEPALIVE_INTERVAL_OPTION, 10), (KEEPALIVE_COUNT_OPTION, 3)):
+            if option is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
+
     def close(self):
         """Close the persistent socket connection."""
         if self._socket:
@@ -259,7 +342,7 @@ class Client:
                 self._socket = None
                 self._is_connected = False
 
-    def _send_command_and_receive_response(self, data_to_send: bytes) -> bytearray:
+    def _send_command_and_receive_response(self, data_to_send: bytes) -> bytes:
         """Helper to send a command and receive its response using the persistent connection."""
         if not self._is_connected or not self._socket:
             LOGGER.warning("Attempting to send command without an active connection. Reconnecting.")
@@ -267,8 +350,24 @@ class Client:
 
         try:
             self._socket.sendall(data_to_send)
-            return_data = bytearray(self._socket.recv(1024))
-            LOGGER.debug("Received response for command: %s", return_data.hex())
+            # Cabecera (dst_id, our_id, longitud, comando) y luego el resto según
+            # la longitud: TCP puede entregar la respuesta en varios segmentos
+            self._recv_exactly(0, FRAME_HEADER_LENGTH)
+            frame_length = max(6 + merge_octets(self._recv_buf[4:6]) + 1, FRAME_HEADER_LENGTH)  # + checksum
+            if frame_length > len(self._recv_buf):
+                self._recv_view.release()
+                self._recv_buf.extend(bytes(frame_length - len(self._recv_buf)))
+                self._recv_view = memoryview(self._recv_buf)
+            self._recv_exactly(FRAME_HEADER_LENGTH, frame_length)
+            if not _verify_frame(self._recv_view[:frame_length]):
+                # Trama corrupta: el flujo ya no es fiable, se fuerza la reconexión
+                self.close()
+                raise CommunicationError(
+                    f"Checksum mismatch in response: {self._recv_buf[:frame_length].hex()}"
+                )
+            # Una sola copia inmutable: el buffer se reutiliza en el próximo comando
+            return_data = bytes(self._recv_view[:frame_length])
+            LOGGER.debug("Received response for command: %s", _LazyHex(return_data))
             return return_data
         except (socket.timeout, ConnectionResetError, BrokenPipeError) as e:
             # En caso de error de comunicación, marcar como desconectado para forzar reconexión
@@ -280,36 +379,30 @@ class Client:
             self._socket = None
             raise CommunicationError(f"OS error during command communication: {e}")
 
+    def _recv_exactly(self, start, end):
+        """Fill _recv_buf[start:end] from the socket."""
+        while start < end:
+            received = self._socket.recv_into(self._recv_view[start:end])
+            if not received:
+                raise ConnectionResetError("Connection closed by the alarm panel")
+            start += received
+
     def auth(self, password):
         """Create an authentication for the current connection."""
         if not isinstance(password, str):
             LOGGER.error(f"Password provided to auth() is not a string. Type: {type(password)}, Value: {password}")
             raise CommunicationError("Password must be a string of 6 digits.")
 
-        pass_array = []
-        if len(password) != 6 or not password.isdigit():
+        if len(password) != 6 or not password.isascii() or not password.isdigit():
             raise CommunicationError(
                 "Cannot parse password, only 6 digits long are accepted"
             )
-            
-        for char in password:
-            pass_array.append(int(char))
-
-        length = [0x00, 0x0a]
-        data = (
-            dst_id
-            + our_id
-            + length
-            + commands["auth"]
-            + [self.device_type]
-            + pass_array
-            + [self.software_version]
-        )
 
-        cs = calculate_checksum(data)
-        payload = bytes(data + [cs])
+        # ASCII digits to their values in one bytes operation ("0" = 0x30)
+        pass_digits = password.encode("ascii").translate(_ASCII_DIGIT_VALUES)
+        payload = _finish_frame(_AUTH_PREFIX, _AUTH_PARAMS.pack(self.device_type, pass_digits, self.software_version))
 
-        LOGGER.debug("Sending authentication: %s", payload.hex())
+        LOGGER.debug("Sending authentication: %s", _LazyHex(payload))
         return_data = self._send_command_and_receive_response(payload)
 
         if len(return_data) < 9:
@@ -332,12 +425,9 @@ class Client:
 
     def status(self):
         """Return the current status."""
-        length = [0x00, 0x02]
-        status_data = dst_id + our_id + length + commands["status"]
-        cs = calculate_checksum(status_data)
-        payload = bytes(status_data + [cs])
+        payload = _STATUS_FRAME
 
-        LOGGER.debug("Sending status command: %s", payload.hex())
+        LOGGER.debug("Sending status command: %s", _LazyHex(payload))
         return_data = self._send_command_and_receive_response(payload)
         
         status = build_status(return_data)
@@ -348,12 +438,9 @@ class Client:
         if partition == 0:
             partition = 0xFF
 
-        length = [0x00, 0x04]
-        arm_data = dst_id + our_id + length + commands["arm_disarm"] + [ partition, 0x01 ] # 0x01 for arm
-        cs = calculate_checksum(arm_data)
-        payload = bytes(arm_data + [cs])
+        payload = _command_frame(_ARM_DISARM_PREFIX, (partition, 0x01)) # 0x01 for arm
 
-        LOGGER.debug("Sending arm command: %s", payload.hex())
+        LOGGER.debug("Sending arm command: %s", _LazyHex(payload))
         return_data = self._send_command_and_receive_response(payload)
         
         if len(return_data) > 9 and return_data[9] in [0x91, 0x99]:
@@ -370,12 +457,9 @@ class Client:
         if partition == 0:
             partition = 0xFF
 
-        length = [0x00, 0x04]
-        disarm_data = dst_id + our_id + length + commands["arm_disarm"] + [ partition, 0x00 ] # 0x00 for disarm
-        cs = calculate_checksum(disarm_data)
-        payload = bytes(disarm_data + [cs])
+        payload = _command_frame(_ARM_DISARM_PREFIX, (partition, 0x00)) # 0x00 for disarm
 
-        LOGGER.debug("Sending disarm command: %s", payload.hex())
+        LOGGER.debug("Sending disarm command: %s", _LazyHex(payload))
         return_data = self._send_command_and_receive_response(payload)
         
         if len(return_data) > 9 and return_data[9] == 0x90:
@@ -387,12 +471,9 @@ class Client:
 
     def panic(self, panic_type):
         """Trigger a panic alarm."""
-        length = [0x00, 0x03]
-        panic_data = dst_id + our_id + length + commands["panic"] +[ panic_type ]
-        cs = calculate_checksum(panic_data)
-        payload = bytes(panic_data + [cs])
+        payload = _command_frame(_PANIC_PREFIX, (panic_type,))
 
-        LOGGER.debug("Sending panic command: %s", payload.hex())
+        LOGGER.debug("Sending panic command: %s", _LazyHex(payload))
         return_data = self._send_command_and_receive_response(payload)
         
         if len(return_data) > 7 and return_data[7] == 0xfe:
@@ -404,12 +485,9 @@ class Client:
     
     def get_paired_sensors(self) -> Dict[str, bool]:
         """Get the list of paired sensors from the alarm panel."""
-        length = [0x00, 0x02] # Command is 2 bytes
-        sensors_data = dst_id + our_id + length + commands["paired_sensors"]
-        cs = calculate_checksum(sensors_data)
-        payload = bytes(sensors_data + [cs])
+        payload = _PAIRED_SENSORS_FRAME
 
-        LOGGER.debug("Sending paired sensors command: %s", payload.hex())
+        LOGGER.debug("Sending paired sensors command: %s", _LazyHex(payload))
         return_data = self._send_command_and_receive_response(payload)
 
         # Check for error response first (0xfd at index 8, if panel sends it)
@@ -421,19 +499,16 @@ class Client:
         # Each byte represents 8 zones (1 bit per zone)
         paired_zones = {}
         try:
-            # Skip header (8 bytes) and read the 8 bytes of zone data
-            for byte_index in range(8):  # 8 bytes = 64 zones
-                # Ensure we have enough data in return_data for the current byte
-                if len(return_data) > 8 + byte_index:
-                    byte_value = return_data[8 + byte_index]
-                    for bit in range(8):
-                        zone_number = (byte_index * 8) + bit + 1
-                        # If the bit is 1, the zone is paired
-                        if (byte_value & (1 << bit)) > 0:
-                            paired_zones[str(zone_number)] = True
-                else:
-                    LOGGER.warning(f"Datos de paired zones incompletos en el byte {byte_index} del payload esperado.")
-                    break # Exit if no more data
+            # Skip header (8 bytes) and read the 8 bytes of zone data (8 bytes = 64 zones)
+            zone_bytes = return_data[8:16]
+            if len(zone_bytes) < 8:
+                LOGGER.warning(f"Datos de paired zones incompletos en el byte {len(zone_bytes)} del payload esperado.")
+            # One little-endian integer: bit n set means zone n + 1 is paired.
+            bits = int.from_bytes(zone_bytes, "little")
+            while bits:
+                lowest = bits & -bits
+                paired_zones[_ZONE_KEYS[lowest.bit_length()]] = True
+                bits ^= lowest
 
         except Exception as e:
             LOGGER.error(f"Error procesando datos de sensores emparejados: {e}", exc_info=True)
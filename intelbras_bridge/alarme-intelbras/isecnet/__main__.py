@@ -10,9 +10,10 @@ Ou com opções:
 import argparse
 import asyncio
 import logging
-import select
+import os
 import sys
-from datetime import datetime
+import threading
+import traceback
 from pathlib import Path
 
 # Adiciona custom_components ao path para permitir imports
@@ -37,6 +38,8 @@ from custom_components.intelbras_amt.lib.protocol.commands import (
 )
 from custom_components.intelbras_amt.lib.const import DEFAULT_PORT
 
+logger = logging.getLogger(__name__)
+
 
 # Configura logging com cores
 class ColoredFormatter(logging.Formatter):
@@ -50,10 +53,13 @@ class ColoredFormatter(logging.Formatter):
         'RESET': '\033[0m',
     }
     
+    # levelname já colorido, montado uma vez por nível em vez de a cada registro
+    COLORED_LEVELNAMES = {
+        level: f"{color}{level}\033[0m" for level, color in COLORS.items() if level != 'RESET'
+    }
+    
     def format(self, record):
-        color = self.COLORS.get(record.levelname, self.COLORS['RESET'])
-        reset = self.COLORS['RESET']
-        record.levelname = f"{color}{record.levelname}{reset}"
+        record.levelname = self.COLORED_LEVELNAMES.get(record.levelname, record.levelname)
         return super().format(record)
 
 
@@ -67,25 +73,46 @@ def setup_logging(verbose: bool = False):
         datefmt='%H:%M:%S'
     ))
     
-    logging.basicConfig(level=level, handlers=[handler])
+    # Handler direto no root: setup_logging roda uma vez só, no início
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
     
     # Reduz verbosidade de alguns loggers
     logging.getLogger('asyncio').setLevel(logging.WARNING)
 
 
+def install_uvloop():
+    """Usa uvloop como event loop se estiver instalado (opcional, sem Windows)."""
+    if sys.platform == "win32":
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.debug("Usando uvloop como event loop")
+
+
+def format_zones(zones: set[int], empty: str = "Nenhuma") -> str:
+    """Lista ordenada de zonas para exibição, ou `empty` se não houver nenhuma."""
+    return str(sorted(zones)) if zones else empty
+
+
 def print_banner():
     """Exibe banner inicial."""
-    print()
-    print("\033[36m" + "═" * 60 + "\033[0m")
-    print("\033[36m" + "  INTELBRAS AMT 2018 / 4010 - Servidor de Desenvolvimento" + "\033[0m")
-    print("\033[36m" + "═" * 60 + "\033[0m")
-    print()
+    out = [
+        "",
+        "\033[36m" + "═" * 60 + "\033[0m",
+        "\033[36m" + "  INTELBRAS AMT 2018 / 4010 - Servidor de Desenvolvimento" + "\033[0m",
+        "\033[36m" + "═" * 60 + "\033[0m",
+        "",
+    ]
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 async def run_server(port: int, password: str, verbose: bool):
     """Executa o servidor."""
-    logger = logging.getLogger(__name__)
-    
     config = AMTServerConfig(
         host="0.0.0.0",
         port=port,
@@ -93,30 +120,69 @@ async def run_server(port: int, password: str, verbose: bool):
     )
     
     server = AMTServer(config)
+    # Nível fixo após setup_logging: evita montar os dumps hex de debug à toa
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    
+    # A senha é fixa durante toda a execução: frames de arme, desarme e sirene
+    # montados uma única vez (chave None = todas as particiones)
+    arm_frames = {
+        'a': ActivationCommand.arm_partition_a(password).build_net_frame(),
+        'b': ActivationCommand.arm_partition_b(password).build_net_frame(),
+        'c': ActivationCommand.arm_partition_c(password).build_net_frame(),
+        'd': ActivationCommand.arm_partition_d(password).build_net_frame(),
+        'stay': ActivationCommand.arm_stay(password).build_net_frame(),
+        None: ActivationCommand.arm_all(password).build_net_frame(),
+    }
+    disarm_frames = {
+        'a': DeactivationCommand.disarm_partition_a(password).build_net_frame(),
+        'b': DeactivationCommand.disarm_partition_b(password).build_net_frame(),
+        'c': DeactivationCommand.disarm_partition_c(password).build_net_frame(),
+        'd': DeactivationCommand.disarm_partition_d(password).build_net_frame(),
+        None: DeactivationCommand.disarm_all(password).build_net_frame(),
+    }
+    siren_frames = {
+        'on': SirenCommand.turn_on_siren(password).build_net_frame(),
+        'off': SirenCommand.turn_off_siren(password).build_net_frame(),
+    }
+    
+    loop = asyncio.get_running_loop()
     
     # Estado
-    connected_at = None
+    connected_at: float | None = None  # loop.time() da conexión (monotônico)
     heartbeat_count = 0
+    # Conexión usada pelos comandos (a primeira central conectada)
+    current_conn_id: str | None = None
     
     @server.on_connect
     async def on_connect(conn):
-        nonlocal connected_at, heartbeat_count
-        connected_at = datetime.now()
+        nonlocal connected_at, heartbeat_count, current_conn_id
+        connected_at = loop.time()
         heartbeat_count = 0
+        if current_conn_id is None:
+            current_conn_id = conn.id
         
         logger.info(f"✅ Central conectada: {conn.host}:{conn.port}")
-        print()
-        print("\033[32m" + "  Central conectada! Agora você pode enviar comandos." + "\033[0m")
-        print("  Digite 'arm' para armar, 'disarm' para desarmar, 'help' para ajuda.")
-        print()
+        out = [
+            "",
+            "\033[32m" + "  Central conectada! Agora você pode enviar comandos." + "\033[0m",
+            "  Digite 'arm' para armar, 'disarm' para desarmar, 'help' para ajuda.",
+            "",
+        ]
+        sys.stdout.write("\n".join(out) + "\n")
     
     @server.on_disconnect
     async def on_disconnect(conn):
-        nonlocal connected_at
+        nonlocal connected_at, current_conn_id
+        
+        if current_conn_id == conn.id:
+            # Passa para outra central ainda conectada, se houver
+            current_conn_id = next(
+                (conn_id for conn_id in server.connections.all() if conn_id != conn.id), None
+            )
         
-        if connected_at:
-            duration = datetime.now() - connected_at
-            logger.warning(f"❌ Central desconectada após {duration}")
+        if connected_at is not None:
+            duration = loop.time() - connected_at
+            logger.warning(f"❌ Central desconectada após {duration:.1f}s")
         else:
             logger.warning(f"❌ Central desconectada: {conn.id}")
         
@@ -134,578 +200,542 @@ async def run_server(port: int, password: str, verbose: bool):
             # Comando de identificação - informações já foram logadas pelo servidor
             info = conn.metadata.get("connection_info")
             if info:
-                print()
-                print(f"  📋 Central identificada:")
-                print(f"     Conta: {info.account}")
-                print(f"     Canal: {info.channel.name_pt}")
-                print(f"     MAC: ...{info.mac_suffix}")
-                print()
+                out = [
+                    "",
+                    f"  📋 Central identificada:",
+                    f"     Conta: {info.account}",
+                    f"     Canal: {info.channel.name_pt}",
+                    f"     MAC: ...{info.mac_suffix}",
+                    "",
+                ]
+                sys.stdout.write("\n".join(out) + "\n")
         else:
-            logger.info(f"📦 Frame recibido: cmd=0x{frame.command:02X} data={frame.content.hex()}")
+            # Conteúdo em hex só com debug (-v); em INFO basta comando e tamanho
+            if debug_enabled:
+                logger.debug(f"📦 Frame recibido: cmd=0x{frame.command:02X} data={frame.content.hex()}")
+            else:
+                logger.info("📦 Frame recibido: cmd=0x%02X (%d bytes)", frame.command, len(frame.content))
     
     # Inicia servidor
     await server.start()
     
-    print(f"  🔌 Servidor iniciado na porta {port}")
-    print(f"  ⏳ Esperando conexión da central...")
-    print()
-    print("  Configure sua central AMT para conectar em:")
-    print(f"    IP: <IP desta máquina>")
-    print(f"    Porta: {port}")
-    print()
-    print("  Comandos: arm, disarm, pgm, siren, info, info-partial, status, quit (ou Ctrl+C)")
-    print()
+    out = [
+        f"  🔌 Servidor iniciado na porta {port}",
+        f"  ⏳ Esperando conexión da central...",
+        "",
+        "  Configure sua central AMT para conectar em:",
+        f"    IP: <IP desta máquina>",
+        f"    Porta: {port}",
+        "",
+        "  Comandos: arm, disarm, pgm, siren, info, info-partial, status, quit (ou Ctrl+C)",
+        "",
+    ]
+    sys.stdout.write("\n".join(out) + "\n")
     
     # Sinaliza quando devemos parar
     stop_event = asyncio.Event()
     
-    def read_stdin_nonblocking() -> str | None:
-        """Lê stdin sem bloquear, devuelve None se no hay entrada."""
-        if select.select([sys.stdin], [], [], 0)[0]:
-            return sys.stdin.readline()
-        return None
+    # Linhas de stdin entregues pelo event loop quando o fd fica legível,
+    # sem polling periódico nem thread do executor
+    stdin_fd = sys.stdin.fileno()
+    cmd_queue: asyncio.Queue[str] = asyncio.Queue()
+    stdin_buf = bytearray()
+    
+    def on_stdin():
+        chunk = os.read(stdin_fd, 4096)
+        if not chunk:
+            # EOF (ex.: stdin redirecionado): sem mais comandos, o servidor segue.
+            # Último comando sem "\n" final ainda é entregue, como no readline()
+            if stdin_buf:
+                cmd_queue.put_nowait(stdin_buf.decode(errors="replace"))
+                stdin_buf.clear()
+            loop.remove_reader(stdin_fd)
+            return
+        stdin_buf.extend(chunk)
+        *lines, rest = stdin_buf.split(b"\n")
+        stdin_buf[:] = rest
+        for raw in lines:
+            cmd_queue.put_nowait(raw.decode(errors="replace"))
+    
+    def stdin_thread():
+        # Fallback bloqueante: cada linha vai para a fila pelo event loop
+        for raw in sys.stdin.buffer:
+            loop.call_soon_threadsafe(cmd_queue.put_nowait, raw.rstrip(b"\n").decode(errors="replace"))
+    
+    # epoll rejeita arquivos regulares (stdin redirecionado de arquivo) com
+    # PermissionError, e o ProactorEventLoop do Windows não tem add_reader
+    try:
+        loop.add_reader(stdin_fd, on_stdin)
+        stdin_reader = True
+    except (PermissionError, NotImplementedError):
+        threading.Thread(target=stdin_thread, name="stdin", daemon=True).start()
+        stdin_reader = False
+    
+    async def dispatch(frame, sending_msg: str, ok_msg: str) -> None:
+        """Envia um frame de comando à central conectada e loga o resultado."""
+        # Verifica conexión
+        conn_id = current_conn_id
+        if conn_id is None:
+            logger.error("❌ Nenhuma central conectada")
+            return
+        
+        logger.info(sending_msg)
+        
+        try:
+            response = await server.send_command(
+                conn_id,
+                frame,
+                wait_response=True,
+            )
+            
+            if response.is_success:
+                logger.info(ok_msg)
+            else:
+                logger.error(f"❌ Erro: {response.message}")
+        
+        except TimeoutError:
+            logger.error("❌ Timeout esperando respuesta")
+        except Exception as e:
+            logger.error(f"❌ Erro: {e}")
+    
+    async def handle_quit(args: list[str]) -> None:
+        """Encerra o servidor."""
+        logger.info("Encerrando servidor...")
+        stop_event.set()
+    
+    async def handle_help(args: list[str]) -> None:
+        """Lista os comandos disponíveis."""
+        out = [
+            "",
+            "  Comandos disponíveis:",
+            "    arm [a|b|c|d|stay]   - Armar alarme (todas ou partición específica)",
+            "    disarm [a|b|c|d]     - Desarmar alarme (todas ou partición específica)",
+            "    pgm <1-19> on|off    - Controlar PGM (ex: pgm 1 on)",
+            "    siren on|off          - Ligar/apagar sirene (ex: siren on)",
+            "    info                 - Solicitar status completo da central (0x5B)",
+            "    info-partial         - Solicitar estado parcial da central (0x5A)",
+            "    status               - Ver status da conexión TCP",
+            "    quit                 - Encerrar servidor",
+            "",
+        ]
+        sys.stdout.write("\n".join(out) + "\n")
+    
+    async def handle_arm(args: list[str]) -> None:
+        """Arma todas as particiones ou a indicada."""
+        partition = args[0] if args else None
+        
+        frame = arm_frames.get(partition, arm_frames[None])
+        await dispatch(frame, "📤 Enviando comando de activación...", "✅ Alarme armado com éxito!")
+    
+    async def handle_disarm(args: list[str]) -> None:
+        """Desarma todas as particiones ou a indicada."""
+        partition = args[0] if args else None
+        
+        frame = disarm_frames.get(partition, disarm_frames[None])
+        await dispatch(frame, "📤 Enviando comando de desactivación...", "✅ Alarme desarmado com éxito!")
+    
+    async def handle_pgm(args: list[str]) -> None:
+        """Liga ou apaga uma PGM."""
+        if len(args) < 2:
+            print("  Uso: pgm <numero> on|off")
+            print("  Exemplo: pgm 1 on")
+            return
+        
+        # isdecimal() em vez de isdigit(): "²" passaria e int() falharia
+        if not args[0].isdecimal():
+            print("  Número de PGM inválido")
+            return
+        pgm_num = int(args[0])
+        action = args[1]
+        
+        if pgm_num < 1 or pgm_num > 19:
+            print("  PGM deve ser entre 1 e 19")
+            return
+        
+        if action not in ('on', 'off'):
+            print("  Ação deve ser 'on' ou 'off'")
+            return
+        
+        # Cria comando
+        if action == 'on':
+            cmd = PGMCommand.turn_on(password, pgm_num)
+        else:
+            cmd = PGMCommand.turn_off(password, pgm_num)
+        
+        action_str = "ligar" if action == 'on' else "apagar"
+        await dispatch(
+            cmd.build_net_frame(),
+            f"📤 Enviando comando para {action_str} PGM {pgm_num}...",
+            f"✅ PGM {pgm_num} {'encendida' if action == 'on' else 'apagada'} com éxito!",
+        )
+    
+    async def handle_siren(args: list[str]) -> None:
+        """Liga ou apaga a sirene."""
+        if not args:
+            print("  Uso: siren on|off")
+            print("  Exemplo: siren on")
+            return
+        
+        action = args[0]
+        if action not in ('on', 'off'):
+            print("  Ação deve ser 'on' ou 'off'")
+            return
+        
+        action_str = "ligar" if action == 'on' else "apagar"
+        await dispatch(
+            siren_frames[action],
+            f"📤 Enviando comando para {action_str} sirene...",
+            f"✅ Sirene {'encendida' if action == 'on' else 'apagada'} com éxito!",
+        )
+    
+    async def handle_info(args: list[str]) -> None:
+        """Solicita e mostra o status completo da central (0x5B)."""
+        # Verifica conexión
+        conn_id = current_conn_id
+        if conn_id is None:
+            logger.error("❌ Nenhuma central conectada")
+            return
+        
+        cmd = StatusRequestCommand(password)
+        frame_to_send = cmd.build_net_frame()
+        logger.info("📤 Solicitando status da central...")
+        if debug_enabled:
+            logger.debug(f"📤 Frame enviado: {frame_to_send.build().hex(' ')}")
+        
+        try:
+            response = await server.send_command(
+                conn_id,
+                frame_to_send,
+                wait_response=True,
+            )
+        
+            # Log detalhado da respuesta
+            if debug_enabled:
+                # Frame serializado e conteúdo uma vez só para o dump
+                raw_built = response.raw_frame.build()
+                content = response.raw_frame.content
+                logger.debug(f"📥 Resposta recebida:")
+                logger.debug(f"   Tipo: {response.response_type}")
+                logger.debug(f"   Código: 0x{response.code:02X}")
+                logger.debug(f"   Tamaño datos: {len(response.data)} bytes")
+                logger.debug(f"   Datos (hex): {response.data.hex(' ') if response.data else '(vazio)'}")
+                logger.debug(f"   is_success: {response.is_success}")
+                logger.debug(f"   Mensagem: {response.message}")
+                logger.debug(f"   Frame bruto (hex): {raw_built.hex(' ')}")
+                logger.debug(f"   Frame content: {content.hex(' ') if content else '(vazio)'}")
+                logger.debug(f"   Frame content length: {len(content)}")
+        
+            if response.is_success and response.data:
+                status = CentralStatus.try_parse(response.data)
+                if status:
+                    # Linhas acumuladas e escritas de uma vez no final
+                    out = []
+                    out.append("")
+                    out.append("  ═══════════════════════════════════════")
+                    out.append("  📊 STATUS DA CENTRAL")
+                    out.append("  ═══════════════════════════════════════")
+                    out.append("")
+        
+                    # Status geral
+                    armed_status = "🔴 ARMADA" if status.armed else "🟢 DESARMADA"
+                    out.append(f"  Estado: {armed_status}")
+        
+                    if status.triggered:
+                        out.append("  ⚠️  ALARME DISPARADO!")
+                    if status.siren_on:
+                        out.append("  🔊 Sirene LIGADA")
+                    if status.has_problem:
+                        out.append("  ⚠️  Há problemas na central")
+        
+                    out.append("")
+                    out.append(f"  Modelo: 0x{status.model:02X}")
+                    out.append(f"  Firmware: v{status.firmware_version}")
+                    if status.central_datetime:
+                        out.append(f"  Data/Hora: {status.central_datetime.strftime('%d/%m/%Y %H:%M')}")
+        
+                    # Particiones
+                    if status.partitions.partitions_enabled:
+                        out.append("")
+                        out.append("  Particiones:")
+                        out.append(f"    A: {'🔴 Armada' if status.partitions.partition_a_armed else '🟢 Desarmada'}")
+                        out.append(f"    B: {'🔴 Armada' if status.partitions.partition_b_armed else '🟢 Desarmada'}")
+                        out.append(f"    C: {'🔴 Armada' if status.partitions.partition_c_armed else '🟢 Desarmada'}")
+                        out.append(f"    D: {'🔴 Armada' if status.partitions.partition_d_armed else '🟢 Desarmada'}")
+        
+                    # Zonas
+                    if status.zones.open_zones:
+                        out.append("")
+                        out.append(f"  Zonas abertas: {sorted(status.zones.open_zones)}")
+                    if status.zones.violated_zones:
+                        out.append(f"  Zonas violadas: {sorted(status.zones.violated_zones)}")
+                    if status.zones.bypassed_zones:
+                        out.append(f"  Zonas em bypass: {sorted(status.zones.bypassed_zones)}")
+        
+                    # PGMs
+                    active_pgms = status.pgm.get_active_pgms()
+                    if active_pgms:
+                        out.append("")
+                        out.append(f"  PGMs encendidas: {active_pgms}")
+        
+                    # Problemas
+                    if status.problems.has_problems:
+                        out.append("")
+                        out.append("  ⚠️  Problemas detectados:")
+                        if status.problems.ac_failure:
+                            out.append("    - Falta de energia elétrica")
+                        if status.problems.low_battery:
+                            out.append("    - Bateria baixa")
+                        if status.problems.battery_absent:
+                            out.append("    - Bateria ausente")
+                        if status.problems.siren_wire_cut:
+                            out.append("    - Fio da sirene cortado")
+        
+                    out.append("")
+                    out.append("  ═══════════════════════════════════════")
+                    out.append("")
+                    sys.stdout.write("\n".join(out) + "\n")
+                else:
+                    logger.error(f"❌ No fue posible analizar status (recibido {len(response.data)} bytes)")
+                    if debug_enabled:
+                        logger.debug(f"   Datos brutos: {response.data.hex(' ')}")
+            else:
+                logger.error(f"❌ Erro: {response.message}")
+                if debug_enabled:
+                    # raw_built/content já calculados no dump acima
+                    logger.debug(f"   Tipo respuesta: {response.response_type}")
+                    logger.debug(f"   Código: 0x{response.code:02X}")
+                    logger.debug(f"   Datos recibidos: {len(response.data)} bytes")
+                    if response.data:
+                        logger.debug(f"   Datos (hex): {response.data.hex(' ')}")
+                    logger.debug(f"   Frame completo (hex): {raw_built.hex(' ')}")
+                    if content:
+                        logger.debug(f"   Frame content (hex): {content.hex(' ')}")
+                        logger.debug(f"   Frame content length: {len(content)}")
+        
+        except TimeoutError:
+            logger.error("❌ Timeout esperando respuesta")
+        except Exception as e:
+            logger.error(f"❌ Erro: {e}")
+            if debug_enabled:
+                logger.debug(f"   Traceback completo:\n{traceback.format_exc()}")
+    
+    async def handle_info_partial(args: list[str]) -> None:
+        """Solicita e mostra o estado parcial da central (0x5A)."""
+        # Verifica conexión
+        conn_id = current_conn_id
+        if conn_id is None:
+            logger.error("❌ Nenhuma central conectada")
+            return
+        
+        cmd = PartialStatusRequestCommand(password)
+        frame_to_send = cmd.build_net_frame()
+        logger.info("📤 Solicitando estado parcial da central (0x5A)...")
+        if debug_enabled:
+            logger.debug(f"📤 Frame enviado: {frame_to_send.build().hex(' ')}")
+        
+        try:
+            response = await server.send_command(
+                conn_id,
+                frame_to_send,
+                wait_response=True,
+            )
+        
+            # Log detalhado da respuesta
+            if debug_enabled:
+                # Frame serializado e conteúdo uma vez só para o dump
+                raw_built = response.raw_frame.build()
+                content = response.raw_frame.content
+                logger.debug(f"📥 Resposta recebida:")
+                logger.debug(f"   Tipo: {response.response_type}")
+                logger.debug(f"   Código: 0x{response.code:02X}")
+                logger.debug(f"   Tamaño datos: {len(response.data)} bytes")
+                logger.debug(f"   Datos (hex): {response.data.hex(' ') if response.data else '(vazio)'}")
+                logger.debug(f"   is_success: {response.is_success}")
+                logger.debug(f"   Mensagem: {response.message}")
+                logger.debug(f"   Frame bruto (hex): {raw_built.hex(' ')}")
+                logger.debug(f"   Frame content: {content.hex(' ') if content else '(vazio)'}")
+                logger.debug(f"   Frame content length: {len(content)}")
+        
+            # Para estado parcial, a respuesta pode ser DATA com 43 bytes
+            if response.response_type == ResponseType.DATA and len(response.raw_frame.content) >= 43:
+                # Resposta com datos grandes - analiza diretamente do content
+                status = PartialCentralStatus.try_parse(response.raw_frame.content)
+                if status:
+                    # Linhas acumuladas e escritas de uma vez no final
+                    out = []
+                    out.append("")
+                    out.append("  ═══════════════════════════════════════")
+                    out.append("  📊 STATUS PARCIAL DA CENTRAL (0x5A)")
+                    out.append("  ═══════════════════════════════════════")
+                    out.append("")
+        
+                    # Status geral
+                    armed_status = "🔴 ARMADA" if status.armed else "🟢 DESARMADA"
+                    out.append(f"  Estado: {armed_status}")
+        
+                    if status.triggered:
+                        out.append("  ⚠️  ALARME DISPARADO!")
+        
+                    out.append("")
+                    out.append(f"  Modelo: 0x{status.model:02X}")
+                    out.append(f"  Firmware: v{status.firmware_version}")
+                    if status.central_datetime:
+                        out.append(f"  Data/Hora: {status.central_datetime.strftime('%d/%m/%Y %H:%M')}")
+        
+                    # Particiones
+                    out.append("")
+                    out.append("  Particiones:")
+                    if status.partitions.partitions_enabled:
+                        out.append(f"    A: {'🔴 Armada' if status.partitions.partition_a_armed else '🟢 Desarmada'}")
+                        out.append(f"    B: {'🔴 Armada' if status.partitions.partition_b_armed else '🟢 Desarmada'}")
+                    else:
+                        out.append("    Particiones desabilitadas")
+        
+                    # Zonas
+                    out.append("")
+                    out.append("  Zonas:")
+                    out.append(f"    Abertas: {format_zones(status.zones.open_zones, 'Nenhuma (todas fechadas)')}")
+                    out.append(f"    Violadas: {format_zones(status.zones.violated_zones)}")
+                    out.append(f"    Em bypass: {format_zones(status.zones.bypassed_zones)}")
+        
+                    # Tamper e cortocircuito
+                    tamper_zones = sorted(status.zones.tamper_zones)
+                    if tamper_zones:
+                        out.append(f"    Com tamper: {tamper_zones}")
+        
+                    short_zones = sorted(status.zones.short_circuit_zones)
+                    if short_zones:
+                        out.append(f"    Em cortocircuito: {short_zones}")
+        
+                    # Bateria baixa sensores sem cable
+                    low_bat_zones = sorted(status.zones.low_battery_zones)
+                    if low_bat_zones:
+                        out.append(f"    Bateria baixa (sem cable): {low_bat_zones}")
+        
+                    # Sirene e PGMs
+                    out.append("")
+                    out.append("  Saídas:")
+                    out.append(f"    Sirene: {'🔊 LIGADA' if status.siren_on else '🔇 Desencendida'}")
+        
+                    active_pgms = status.pgm.get_active_pgms()
+                    if active_pgms:
+                        out.append(f"    PGMs encendidas: {active_pgms}")
+                    else:
+                        out.append("    PGMs encendidas: Nenhuma")
+        
+                    # Problemas
+                    out.append("")
+                    if status.problems.has_problems:
+                        out.append("  ⚠️  Problemas detectados:")
+                        if status.problems.ac_failure:
+                            out.append("    - Falta de energia elétrica")
+                        if status.problems.low_battery:
+                            out.append("    - Bateria baixa")
+                        if status.problems.battery_absent:
+                            out.append("    - Bateria ausente ou invertida")
+                        if status.problems.battery_short:
+                            out.append("    - Bateria em cortocircuito")
+                        if status.problems.aux_overload:
+                            out.append("    - Sobrecarga na salida auxiliar")
+                        if status.problems.keyboard_problems:
+                            out.append(f"    - Problemas nos teclados: {status.problems.keyboard_problems}")
+                        if status.problems.keyboard_tamper:
+                            out.append(f"    - Tamper nos teclados: {status.problems.keyboard_tamper}")
+                        if status.problems.receiver_problems:
+                            out.append(f"    - Problemas nos receptores: {status.problems.receiver_problems}")
+                        if status.problems.siren_wire_cut:
+                            out.append("    - Fio da sirene cortado")
+                        if status.problems.siren_short:
+                            out.append("    - Curto-circuito no cable da sirene")
+                        if status.problems.phone_line_cut:
+                            out.append("    - Linha telefônica cortada")
+                        if status.problems.event_comm_failure:
+                            out.append("    - Fallo ao comunicar evento")
+                    else:
+                        out.append("  ✅ Nenhum problema detectado")
+        
+                    out.append("")
+                    out.append("  ═══════════════════════════════════════")
+                    out.append("")
+                    sys.stdout.write("\n".join(out) + "\n")
+                else:
+                    logger.error(f"❌ No fue posible analizar estado parcial (recibido {len(response.raw_frame.content)} bytes)")
+            elif response.is_success and response.data:
+                # Resposta ACK com datos (formato antigo)
+                status = PartialCentralStatus.try_parse(response.data)
+                if status:
+                    logger.info("✅ Status parcial recibido e analizado!")
+                else:
+                    logger.error(f"❌ No fue posible analizar estado parcial (recibido {len(response.data)} bytes)")
+            else:
+                logger.error(f"❌ Erro: {response.message}")
+                if debug_enabled:
+                    # raw_built/content já calculados no dump acima
+                    logger.debug(f"   Tipo respuesta: {response.response_type}")
+                    logger.debug(f"   Código: 0x{response.code:02X}")
+                    logger.debug(f"   Datos recibidos: {len(response.data)} bytes")
+                    if response.data:
+                        logger.debug(f"   Datos (hex): {response.data.hex(' ')}")
+                    logger.debug(f"   Frame completo (hex): {raw_built.hex(' ')}")
+                    if content:
+                        logger.debug(f"   Frame content (hex): {content.hex(' ')}")
+                        logger.debug(f"   Frame content length: {len(content)}")
+        
+        except TimeoutError:
+            logger.error("❌ Timeout esperando respuesta")
+        except Exception as e:
+            logger.error(f"❌ Erro: {e}")
+            if debug_enabled:
+                logger.debug(f"   Traceback completo:\n{traceback.format_exc()}")
+    
+    async def handle_status(args: list[str]) -> None:
+        """Mostra as conexões TCP ativas."""
+        connections = server.connections.all()
+        out = []
+        out.append("")
+        out.append(f"  Conexões ativas: {len(connections)}")
+        for conn_id, conn in connections.items():
+            out.append(f"    - {conn_id} (conectado em {conn.connected_at})")
+            if conn.metadata.get("account"):
+                out.append(f"      Conta: {conn.metadata['account']}")
+        if connected_at is not None:
+            out.append(f"  Heartbeats recibidos: {heartbeat_count}")
+        out.append("")
+        sys.stdout.write("\n".join(out) + "\n")
+    
+    # Verbo -> handler; cada handler recebe os argumentos após o verbo
+    handlers = {
+        'quit': handle_quit,
+        'exit': handle_quit,
+        'q': handle_quit,
+        'help': handle_help,
+        'arm': handle_arm,
+        'disarm': handle_disarm,
+        'pgm': handle_pgm,
+        'siren': handle_siren,
+        'info': handle_info,
+        'info-partial': handle_info_partial,
+        'status': handle_status,
+    }
     
     # Task para ler comandos
     async def command_loop():
-        loop = asyncio.get_event_loop()
-        
         while not stop_event.is_set():
             try:
-                # Usa executor com função non-blocking
-                line = await loop.run_in_executor(None, read_stdin_nonblocking)
+                line = await cmd_queue.get()
                 
-                if line is None:
-                    # Sem input, espera um pouco antes de verificar novamente
-                    await asyncio.sleep(0.1)
+                parts = line.strip().lower().split()
+                if not parts:
                     continue
                 
-                line = line.strip().lower()
-                
-                if not line:
+                handler = handlers.get(parts[0])
+                if handler is None:
+                    print(f"  Comando desconocido: {' '.join(parts)}")
+                    print("  Digite 'help' para ver comandos disponíveis")
                     continue
                 
-                if line in ('quit', 'exit', 'q'):
-                    logger.info("Encerrando servidor...")
-                    stop_event.set()
-                    return
-                
-                elif line == 'help':
-                    print()
-                    print("  Comandos disponíveis:")
-                    print("    arm [a|b|c|d|stay]   - Armar alarme (todas ou partición específica)")
-                    print("    disarm [a|b|c|d]     - Desarmar alarme (todas ou partición específica)")
-                    print("    pgm <1-19> on|off    - Controlar PGM (ex: pgm 1 on)")
-                    print("    siren on|off          - Ligar/apagar sirene (ex: siren on)")
-                    print("    info                 - Solicitar status completo da central (0x5B)")
-                    print("    info-partial         - Solicitar estado parcial da central (0x5A)")
-                    print("    status               - Ver status da conexión TCP")
-                    print("    quit                 - Encerrar servidor")
-                    print()
-                
-                elif line.startswith('arm'):
-                    parts = line.split()
-                    partition = parts[1] if len(parts) > 1 else None
-                    
-                    # Verifica conexión
-                    connections = server.connections.all()
-                    if not connections:
-                        logger.error("❌ Nenhuma central conectada")
-                        continue
-                    
-                    conn_id = list(connections.keys())[0]
-                    
-                    # Cria comando
-                    if partition == 'a':
-                        cmd = ActivationCommand.arm_partition_a(password)
-                    elif partition == 'b':
-                        cmd = ActivationCommand.arm_partition_b(password)
-                    elif partition == 'c':
-                        cmd = ActivationCommand.arm_partition_c(password)
-                    elif partition == 'd':
-                        cmd = ActivationCommand.arm_partition_d(password)
-                    elif partition == 'stay':
-                        cmd = ActivationCommand.arm_stay(password)
-                    else:
-                        cmd = ActivationCommand.arm_all(password)
-                    
-                    logger.info(f"📤 Enviando comando de activación...")
-                    
-                    try:
-                        response = await server.send_command(
-                            conn_id,
-                            cmd.build_net_frame(),
-                            wait_response=True,
-                        )
-                        
-                        if response.is_success:
-                            logger.info("✅ Alarme armado com éxito!")
-                        else:
-                            logger.error(f"❌ Erro: {response.message}")
-                    
-                    except TimeoutError:
-                        logger.error("❌ Timeout esperando respuesta")
-                    except Exception as e:
-                        logger.error(f"❌ Erro: {e}")
-                
-                elif line.startswith('disarm'):
-                    parts = line.split()
-                    partition = parts[1] if len(parts) > 1 else None
-                    
-                    # Verifica conexión
-                    connections = server.connections.all()
-                    if not connections:
-                        logger.error("❌ Nenhuma central conectada")
-                        continue
-                    
-                    conn_id = list(connections.keys())[0]
-                    
-                    # Cria comando
-                    if partition == 'a':
-                        cmd = DeactivationCommand.disarm_partition_a(password)
-                    elif partition == 'b':
-                        cmd = DeactivationCommand.disarm_partition_b(password)
-                    elif partition == 'c':
-                        cmd = DeactivationCommand.disarm_partition_c(password)
-                    elif partition == 'd':
-                        cmd = DeactivationCommand.disarm_partition_d(password)
-                    else:
-                        cmd = DeactivationCommand.disarm_all(password)
-                    
-                    logger.info(f"📤 Enviando comando de desactivación...")
-                    
-                    try:
-                        response = await server.send_command(
-                            conn_id,
-                            cmd.build_net_frame(),
-                            wait_response=True,
-                        )
-                        
-                        if response.is_success:
-                            logger.info("✅ Alarme desarmado com éxito!")
-                        else:
-                            logger.error(f"❌ Erro: {response.message}")
-                    
-                    except TimeoutError:
-                        logger.error("❌ Timeout esperando respuesta")
-                    except Exception as e:
-                        logger.error(f"❌ Erro: {e}")
-                
-                elif line.startswith('pgm'):
-                    parts = line.split()
-                    if len(parts) < 3:
-                        print("  Uso: pgm <numero> on|off")
-                        print("  Exemplo: pgm 1 on")
-                        continue
-                    
-                    try:
-                        pgm_num = int(parts[1])
-                        action = parts[2]
-                    except ValueError:
-                        print("  Número de PGM inválido")
-                        continue
-                    
-                    if pgm_num < 1 or pgm_num > 19:
-                        print("  PGM deve ser entre 1 e 19")
-                        continue
-                    
-                    if action not in ('on', 'off'):
-                        print("  Ação deve ser 'on' ou 'off'")
-                        continue
-                    
-                    # Verifica conexión
-                    connections = server.connections.all()
-                    if not connections:
-                        logger.error("❌ Nenhuma central conectada")
-                        continue
-                    
-                    conn_id = list(connections.keys())[0]
-                    
-                    # Cria comando
-                    if action == 'on':
-                        cmd = PGMCommand.turn_on(password, pgm_num)
-                    else:
-                        cmd = PGMCommand.turn_off(password, pgm_num)
-                    
-                    action_str = "ligar" if action == 'on' else "apagar"
-                    logger.info(f"📤 Enviando comando para {action_str} PGM {pgm_num}...")
-                    
-                    try:
-                        response = await server.send_command(
-                            conn_id,
-                            cmd.build_net_frame(),
-                            wait_response=True,
-                        )
-                        
-                        if response.is_success:
-                            logger.info(f"✅ PGM {pgm_num} {'encendida' if action == 'on' else 'apagada'} com éxito!")
-                        else:
-                            logger.error(f"❌ Erro: {response.message}")
-                    
-                    except TimeoutError:
-                        logger.error("❌ Timeout esperando respuesta")
-                    except Exception as e:
-                        logger.error(f"❌ Erro: {e}")
-                
-                elif line.startswith('siren'):
-                    parts = line.split()
-                    if len(parts) < 2:
-                        print("  Uso: siren on|off")
-                        print("  Exemplo: siren on")
-                        continue
-                    
-                    action = parts[1]
-                    if action not in ('on', 'off'):
-                        print("  Ação deve ser 'on' ou 'off'")
-                        continue
-                    
-                    # Verifica conexión
-                    connections = server.connections.all()
-                    if not connections:
-                        logger.error("❌ Nenhuma central conectada")
-                        continue
-                    
-                    conn_id = list(connections.keys())[0]
-                    
-                    # Cria comando
-                    if action == 'on':
-                        cmd = SirenCommand.turn_on_siren(password)
-                    else:
-                        cmd = SirenCommand.turn_off_siren(password)
-                    
-                    action_str = "ligar" if action == 'on' else "apagar"
-                    logger.info(f"📤 Enviando comando para {action_str} sirene...")
-                    
-                    try:
-                        response = await server.send_command(
-                            conn_id,
-                            cmd.build_net_frame(),
-                            wait_response=True,
-                        )
-                        
-                        if response.is_success:
-                            logger.info(f"✅ Sirene {'encendida' if action == 'on' else 'apagada'} com éxito!")
-                        else:
-                            logger.error(f"❌ Erro: {response.message}")
-                    
-                    except TimeoutError:
-                        logger.error("❌ Timeout esperando respuesta")
-                    except Exception as e:
-                        logger.error(f"❌ Erro: {e}")
-                
-                elif line == 'info':
-                    # Verifica conexión
-                    connections = server.connections.all()
-                    if not connections:
-                        logger.error("❌ Nenhuma central conectada")
-                        continue
-                    
-                    conn_id = list(connections.keys())[0]
-                    
-                    cmd = StatusRequestCommand(password)
-                    frame_to_send = cmd.build_net_frame()
-                    logger.info("📤 Solicitando status da central...")
-                    logger.debug(f"📤 Frame enviado: {frame_to_send.build().hex(' ')}")
-                    
-                    try:
-                        response = await server.send_command(
-                            conn_id,
-                            frame_to_send,
-                            wait_response=True,
-                        )
-                        
-                        # Log detalhado da respuesta
-                        logger.debug(f"📥 Resposta recebida:")
-                        logger.debug(f"   Tipo: {response.response_type}")
-                        logger.debug(f"   Código: 0x{response.code:02X}")
-                        logger.debug(f"   Tamaño datos: {len(response.data)} bytes")
-                        logger.debug(f"   Datos (hex): {response.data.hex(' ') if response.data else '(vazio)'}")
-                        logger.debug(f"   is_success: {response.is_success}")
-                        logger.debug(f"   Mensagem: {response.message}")
-                        logger.debug(f"   Frame bruto (hex): {response.raw_frame.build().hex(' ')}")
-                        logger.debug(f"   Frame content: {response.raw_frame.content.hex(' ') if response.raw_frame.content else '(vazio)'}")
-                        logger.debug(f"   Frame content length: {len(response.raw_frame.content)}")
-                        
-                        if response.is_success and response.data:
-                            status = CentralStatus.try_parse(response.data)
-                            if status:
-                                print()
-                                print("  ═══════════════════════════════════════")
-                                print("  📊 STATUS DA CENTRAL")
-                                print("  ═══════════════════════════════════════")
-                                print()
-                                
-                                # Status geral
-                                armed_status = "🔴 ARMADA" if status.armed else "🟢 DESARMADA"
-                                print(f"  Estado: {armed_status}")
-                                
-                                if status.triggered:
-                                    print("  ⚠️  ALARME DISPARADO!")
-                                if status.siren_on:
-                                    print("  🔊 Sirene LIGADA")
-                                if status.has_problem:
-                                    print("  ⚠️  Há problemas na central")
-                                
-                                print()
-                                print(f"  Modelo: 0x{status.model:02X}")
-                                print(f"  Firmware: v{status.firmware_version}")
-                                if status.central_datetime:
-                                    print(f"  Data/Hora: {status.central_datetime.strftime('%d/%m/%Y %H:%M')}")
-                                
-                                # Particiones
-                                if status.partitions.partitions_enabled:
-                                    print()
-                                    print("  Particiones:")
-                                    print(f"    A: {'🔴 Armada' if status.partitions.partition_a_armed else '🟢 Desarmada'}")
-                                    print(f"    B: {'🔴 Armada' if status.partitions.partition_b_armed else '🟢 Desarmada'}")
-                                    print(f"    C: {'🔴 Armada' if status.partitions.partition_c_armed else '🟢 Desarmada'}")
-                                    print(f"    D: {'🔴 Armada' if status.partitions.partition_d_armed else '🟢 Desarmada'}")
-                                
-                                # Zonas
-                                if status.zones.open_zones:
-                                    print()
-                                    print(f"  Zonas abertas: {sorted(status.zones.open_zones)}")
-                                if status.zones.violated_zones:
-                                    print(f"  Zonas violadas: {sorted(status.zones.violated_zones)}")
-                                if status.zones.bypassed_zones:
-                                    print(f"  Zonas em bypass: {sorted(status.zones.bypassed_zones)}")
-                                
-                                # PGMs
-                                active_pgms = status.pgm.get_active_pgms()
-                                if active_pgms:
-                                    print()
-                                    print(f"  PGMs encendidas: {active_pgms}")
-                                
-                                # Problemas
-                                if status.problems.has_problems:
-                                    print()
-                                    print("  ⚠️  Problemas detectados:")
-                                    if status.problems.ac_failure:
-                                        print("    - Falta de energia elétrica")
-                                    if status.problems.low_battery:
-                                        print("    - Bateria baixa")
-                                    if status.problems.battery_absent:
-                                        print("    - Bateria ausente")
-                                    if status.problems.siren_wire_cut:
-                                        print("    - Fio da sirene cortado")
-                                
-                                print()
-                                print("  ═══════════════════════════════════════")
-                                print()
-                            else:
-                                logger.error(f"❌ No fue posible analizar status (recibido {len(response.data)} bytes)")
-                                logger.debug(f"   Datos brutos: {response.data.hex(' ')}")
-                        else:
-                            logger.error(f"❌ Erro: {response.message}")
-                            logger.debug(f"   Tipo respuesta: {response.response_type}")
-                            logger.debug(f"   Código: 0x{response.code:02X}")
-                            logger.debug(f"   Datos recibidos: {len(response.data)} bytes")
-                            if response.data:
-                                logger.debug(f"   Datos (hex): {response.data.hex(' ')}")
-                            logger.debug(f"   Frame completo (hex): {response.raw_frame.build().hex(' ')}")
-                            if response.raw_frame.content:
-                                logger.debug(f"   Frame content (hex): {response.raw_frame.content.hex(' ')}")
-                                logger.debug(f"   Frame content length: {len(response.raw_frame.content)}")
-                    
-                    except TimeoutError:
-                        logger.error("❌ Timeout esperando respuesta")
-                    except Exception as e:
-                        logger.error(f"❌ Erro: {e}")
-                        import traceback
-                        logger.debug(f"   Traceback completo:\n{traceback.format_exc()}")
-                
-                elif line == 'info-partial':
-                    # Verifica conexión
-                    connections = server.connections.all()
-                    if not connections:
-                        logger.error("❌ Nenhuma central conectada")
-                        continue
-                    
-                    conn_id = list(connections.keys())[0]
-                    
-                    cmd = PartialStatusRequestCommand(password)
-                    frame_to_send = cmd.build_net_frame()
-                    logger.info("📤 Solicitando estado parcial da central (0x5A)...")
-                    logger.debug(f"📤 Frame enviado: {frame_to_send.build().hex(' ')}")
-                    
-                    try:
-                        response = await server.send_command(
-                            conn_id,
-                            frame_to_send,
-                            wait_response=True,
-                        )
-                        
-                        # Log detalhado da respuesta
-                        logger.debug(f"📥 Resposta recebida:")
-                        logger.debug(f"   Tipo: {response.response_type}")
-                        logger.debug(f"   Código: 0x{response.code:02X}")
-                        logger.debug(f"   Tamaño datos: {len(response.data)} bytes")
-                        logger.debug(f"   Datos (hex): {response.data.hex(' ') if response.data else '(vazio)'}")
-                        logger.debug(f"   is_success: {response.is_success}")
-                        logger.debug(f"   Mensagem: {response.message}")
-                        logger.debug(f"   Frame bruto (hex): {response.raw_frame.build().hex(' ')}")
-                        logger.debug(f"   Frame content: {response.raw_frame.content.hex(' ') if response.raw_frame.content else '(vazio)'}")
-                        logger.debug(f"   Frame content length: {len(response.raw_frame.content)}")
-                        
-                        # Para estado parcial, a respuesta pode ser DATA com 43 bytes
-                        if response.response_type == ResponseType.DATA and len(response.raw_frame.content) >= 43:
-                            # Resposta com datos grandes - analiza diretamente do content
-                            status = PartialCentralStatus.try_parse(response.raw_frame.content)
-                            if status:
-                                print()
-                                print("  ═══════════════════════════════════════")
-                                print("  📊 STATUS PARCIAL DA CENTRAL (0x5A)")
-                                print("  ═══════════════════════════════════════")
-                                print()
-                                
-                                # Status geral
-                                armed_status = "🔴 ARMADA" if status.armed else "🟢 DESARMADA"
-                                print(f"  Estado: {armed_status}")
-                                
-                                if status.triggered:
-                                    print("  ⚠️  ALARME DISPARADO!")
-                                
-                                print()
-                                print(f"  Modelo: 0x{status.model:02X}")
-                                print(f"  Firmware: v{status.firmware_version}")
-                                if status.central_datetime:
-                                    print(f"  Data/Hora: {status.central_datetime.strftime('%d/%m/%Y %H:%M')}")
-                                
-                                # Particiones
-                                print()
-                                print("  Particiones:")
-                                if status.partitions.partitions_enabled:
-                                    print(f"    A: {'🔴 Armada' if status.partitions.partition_a_armed else '🟢 Desarmada'}")
-                                    print(f"    B: {'🔴 Armada' if status.partitions.partition_b_armed else '🟢 Desarmada'}")
-                                else:
-                                    print("    Particiones desabilitadas")
-                                
-                                # Zonas
-                                print()
-                                print("  Zonas:")
-                                open_zones = sorted(status.zones.open_zones)
-                                if open_zones:
-                                    print(f"    Abertas: {open_zones}")
-                                else:
-                                    print("    Abertas: Nenhuma (todas fechadas)")
-                                
-                                violated_zones = sorted(status.zones.violated_zones)
-                                if violated_zones:
-                                    print(f"    Violadas: {violated_zones}")
-                                else:
-                                    print("    Violadas: Nenhuma")
-                                
-                                bypassed_zones = sorted(status.zones.bypassed_zones)
-                                if bypassed_zones:
-                                    print(f"    Em bypass: {bypassed_zones}")
-                                else:
-                                    print("    Em bypass: Nenhuma")
-                                
-                                # Tamper e cortocircuito
-                                tamper_zones = sorted(status.zones.tamper_zones)
-                                if tamper_zones:
-                                    print(f"    Com tamper: {tamper_zones}")
-                                
-                                short_zones = sorted(status.zones.short_circuit_zones)
-                                if short_zones:
-                                    print(f"    Em cortocircuito: {short_zones}")
-                                
-                                # Bateria baixa sensores sem cable
-                                low_bat_zones = sorted(status.zones.low_battery_zones)
-                                if low_bat_zones:
-                                    print(f"    Bateria baixa (sem cable): {low_bat_zones}")
-                                
-                                # Sirene e PGMs
-                                print()
-                                print("  Saídas:")
-                                print(f"    Sirene: {'🔊 LIGADA' if status.siren_on else '🔇 Desencendida'}")
-                                
-                                active_pgms = status.pgm.get_active_pgms()
-                                if active_pgms:
-                                    print(f"    PGMs encendidas: {active_pgms}")
-                                else:
-                                    print("    PGMs encendidas: Nenhuma")
-                                
-                                # Problemas
-                                print()
-                                if status.problems.has_problems:
-                                    print("  ⚠️  Problemas detectados:")
-                                    if status.problems.ac_failure:
-                                        print("    - Falta de energia elétrica")
-                                    if status.problems.low_battery:
-                                        print("    - Bateria baixa")
-                                    if status.problems.battery_absent:
-                                        print("    - Bateria ausente ou invertida")
-                                    if status.problems.battery_short:
-                                        print("    - Bateria em cortocircuito")
-                                    if status.problems.aux_overload:
-                                        print("    - Sobrecarga na salida auxiliar")
-                                    if status.problems.keyboard_problems:
-                                        print(f"    - Problemas nos teclados: {status.problems.keyboard_problems}")
-                                    if status.problems.keyboard_tamper:
-                                        print(f"    - Tamper nos teclados: {status.problems.keyboard_tamper}")
-                                    if status.problems.receiver_problems:
-                                        print(f"    - Problemas nos receptores: {status.problems.receiver_problems}")
-                                    if status.problems.siren_wire_cut:
-                                        print("    - Fio da sirene cortado")
-                                    if status.problems.siren_short:
-                                        print("    - Curto-circuito no cable da sirene")
-                                    if status.problems.phone_line_cut:
-                                        print("    - Linha telefônica cortada")
-                                    if status.problems.event_comm_failure:
-                                        print("    - Fallo ao comunicar evento")
-                                else:
-                                    print("  ✅ Nenhum problema detectado")
-                                
-                                print()
-                                print("  ═══════════════════════════════════════")
-                                print()
-                            else:
-                                logger.error(f"❌ No fue posible analizar estado parcial (recibido {len(response.raw_frame.content)} bytes)")
-                        elif response.is_success and response.data:
-                            # Resposta ACK com datos (formato antigo)
-                            status = PartialCentralStatus.try_parse(response.data)
-                            if status:
-                                logger.info("✅ Status parcial recibido e analizado!")
-                            else:
-                                logger.error(f"❌ No fue posible analizar estado parcial (recibido {len(response.data)} bytes)")
-                        else:
-                            logger.error(f"❌ Erro: {response.message}")
-                            logger.debug(f"   Tipo respuesta: {response.response_type}")
-                            logger.debug(f"   Código: 0x{response.code:02X}")
-                            logger.debug(f"   Datos recibidos: {len(response.data)} bytes")
-                            if response.data:
-                                logger.debug(f"   Datos (hex): {response.data.hex(' ')}")
-                            logger.debug(f"   Frame completo (hex): {response.raw_frame.build().hex(' ')}")
-                            if response.raw_frame.content:
-                                logger.debug(f"   Frame content (hex): {response.raw_frame.content.hex(' ')}")
-                                logger.debug(f"   Frame content length: {len(response.raw_frame.content)}")
-                    
-                    except TimeoutError:
-                        logger.error("❌ Timeout esperando respuesta")
-                    except Exception as e:
-                        logger.error(f"❌ Erro: {e}")
-                        import traceback
-                        logger.debug(f"   Traceback completo:\n{traceback.format_exc()}")
-                
-                elif line == 'status':
-                    connections = server.connections.all()
-                    print()
-                    print(f"  Conexões ativas: {len(connections)}")
-                    for conn_id, conn in connections.items():
-                        print(f"    - {conn_id} (conectado em {conn.connected_at})")
-                        if conn.metadata.get("account"):
-                            print(f"      Conta: {conn.metadata['account']}")
-                    if connected_at:
-                        print(f"  Heartbeats recibidos: {heartbeat_count}")
-                    print()
-                
-                else:
-                    print(f"  Comando desconocido: {line}")
-                    print("  Digite 'help' para ver comandos disponíveis")
+                await handler(parts[1:])
             
-            except EOFError:
-                stop_event.set()
-                return
             except Exception as e:
                 if not stop_event.is_set():
                     logger.error(f"Erro: {e}")
@@ -716,6 +746,8 @@ async def run_server(port: int, password: str, verbose: bool):
     except KeyboardInterrupt:
         logger.info("Interrormpido pelo usuario")
     finally:
+        if stdin_reader:
+            loop.remove_reader(stdin_fd)
         await server.stop()
 
 
@@ -760,6 +792,7 @@ Exemplos:
         sys.exit(1)
     
     setup_logging(args.verbose)
+    install_uvloop()
     print_banner()
     
     try:
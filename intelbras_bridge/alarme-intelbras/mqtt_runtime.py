@@ -1,4 +1,12 @@
+import json
 import logging
+import socket
+import threading
+
+# Estado de cada zona guardado como un byte: índice en esta tupla.
+ZONE_STATE_NAMES = ("Desconocido", "Cerrada", "Abierta", "Disparada")
+_ZONE_STATE_CODES = {name: code for code, name in enumerate(ZONE_STATE_NAMES)}
+_TRIGGERED = _ZONE_STATE_CODES["Disparada"]
 
 
 class MQTTRuntime:
@@ -8,54 +16,249 @@ class MQTTRuntime:
         base_topic,
         command_topic,
         availability_topic,
-        zone_states,
+        zone_ids,
         alarm_lock,
         protocol_handler_getter,
     ):
         self.mqtt_client = mqtt_client
+        # Método ligado una vez; se llama con argumentos posicionales
+        # (tópico, payload, qos, retain, properties) en el bucle de publicación.
+        self._mqtt_publish = mqtt_client.publish
         self.base_topic = base_topic
         self.command_topic = command_topic
         self.availability_topic = availability_topic
-        self.zone_states = zone_states
+        self.zone_ids = frozenset(zone_ids)
         self.alarm_lock = alarm_lock
         self.protocol_handler_getter = protocol_handler_getter
+        self.zones_topic = f"{base_topic}/zones"
+        # Tópicos precalculados una sola vez en lugar de formatearlos en cada publicación.
+        self.zone_topics = {zone_id: f"{base_topic}/zone_{zone_id}" for zone_id in self.zone_ids}
+        # (zona, tópico) en orden, para republicar todas las zonas sin buscar en el dict.
+        self.zone_topic_pairs = tuple(sorted(self.zone_topics.items()))
+        self.topics = {
+            name: f"{base_topic}/{name}"
+            for name in (
+                "ac_power",
+                "panic",
+                "partition_a_state",
+                "partition_b_state",
+                "partition_c_state",
+                "partition_d_state",
+                "system_battery",
+                "tamper",
+                "triggered_zones",
+            )
+        }
+        # Estado de la alarma, pánico y disponibilidad van con QoS 1 para no perderse;
+        # el resto es telemetría QoS 0 que el siguiente sondeo vuelve a enviar.
+        self._qos1_topics = frozenset({f"{base_topic}/state", self.topics["panic"], availability_topic})
+        # Valores retenidos que se republican en cada conexión al bróker.
+        self.connect_defaults = (
+            (availability_topic, "online"),
+            (self.topics["ac_power"], "on"),
+            (self.topics["system_battery"], "off"),
+            (self.topics["tamper"], "off"),
+            (self.topics["panic"], "off"),
+            (self.topics["triggered_zones"], "Ninguna"),
+            (self.topics["partition_a_state"], "OFF"),
+            (self.topics["partition_b_state"], "OFF"),
+            (self.topics["partition_c_state"], "OFF"),
+            (self.topics["partition_d_state"], "OFF"),
+        )
+        # Último payload retenido enviado por tópico; se vacía al reconectar.
+        self._last_published = {}
+        self._publish_lock = threading.Lock()
+        # Alias de tópico MQTT 5 por conexión: tópico -> propiedades con el alias.
+        # Solo se usan si el bróker anuncia TopicAliasMaximum en el CONNACK.
+        self._topic_alias_max = 0
+        self._topic_aliases = {}
+        # Zonas modificadas desde la última publicación (protegido por alarm_lock).
+        self.dirty_zones = set()
+        # Un byte por zona, indexado por número de zona (protegido por alarm_lock).
+        self._zone_codes = bytearray(max(self.zone_ids, default=0) + 1)
+        # Copia inmutable de _zone_codes: los escritores la reemplazan entera bajo
+        # alarm_lock y los lectores la usan sin lock.
+        self.zone_snapshot = bytes(self._zone_codes)
+        # Última copia publicada, para no republicar zonas que volvieron a su valor.
+        self._published_snapshot = None
+        # Serializa captura + envío de zonas y zonas disparadas: se toma dentro de
+        # alarm_lock (nunca antes) y se suelta al terminar publish_batch, para que
+        # una copia más vieja no se publique después de una más nueva.
+        self._zone_publish_lock = threading.Lock()
+        # Zonas en "Disparada", mantenidas al escribir para no recorrer todas al publicar.
+        self._triggered = set()
+        self.triggered_snapshot = ()
 
     def configure_client(self):
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
         self.mqtt_client.will_set(self.availability_topic, "offline", retain=True)
+        # Casi todo es telemetría QoS 0; que los pocos mensajes QoS 1 no limiten las ráfagas de sondeo.
+        self.mqtt_client.max_inflight_messages_set(100)
+
+    def get_zone_state(self, zone_id):
+        # Debe llamarse con alarm_lock tomado.
+        return ZONE_STATE_NAMES[self._zone_codes[zone_id]]
+
+    def set_zone_state(self, zone_id, state):
+        # Debe llamarse con alarm_lock tomado.
+        code = _ZONE_STATE_CODES[state]
+        if self._zone_codes[zone_id] != code:
+            self._zone_codes[zone_id] = code
+            self.dirty_zones.add(zone_id)
+            self.zone_snapshot = bytes(self._zone_codes)
+            self._update_triggered((zone_id,), code)
+
+    def set_all_zone_states(self, state):
+        # Debe llamarse con alarm_lock tomado.
+        code = _ZONE_STATE_CODES[state]
+        changed = [zone_id for zone_id in self.zone_ids if self._zone_codes[zone_id] != code]
+        if not changed:
+            return
+        for zone_id in changed:
+            self._zone_codes[zone_id] = code
+        self.dirty_zones.update(changed)
+        self.zone_snapshot = bytes(self._zone_codes)
+        self._update_triggered(changed, code)
+
+    def _update_triggered(self, zone_ids, code):
+        # Debe llamarse con alarm_lock tomado.
+        if code == _TRIGGERED:
+            self._triggered.update(zone_ids)
+        elif self._triggered.isdisjoint(zone_ids):
+            return
+        else:
+            self._triggered.difference_update(zone_ids)
+        self.triggered_snapshot = self._sorted_zone_ids(self._triggered)
 
     def publish_zone_states(self):
-        for zone_id, state in self.zone_states.items():
-            self.mqtt_client.publish(f"{self.base_topic}/zone_{zone_id}", state, retain=True)
-        logging.info(f"Estados de zona publicados a MQTT: {self.zone_states}")
+        # No llamar con alarm_lock tomado: alarm_lock solo cubre el intercambio del
+        # conjunto de zonas modificadas; serializar y publicar se hace fuera de él,
+        # pero bajo _zone_publish_lock para publicar las copias en orden.
+        with self.alarm_lock:
+            if not self.dirty_zones:
+                return
+            self._zone_publish_lock.acquire()
+            dirty_zones, self.dirty_zones = self.dirty_zones, set()
+            snapshot = self.zone_snapshot
+            published, self._published_snapshot = self._published_snapshot, snapshot
+        try:
+            if snapshot == published:
+                return
+            if published is not None:
+                dirty_zones = self._changed_zone_ids(snapshot, published)
+            payload = self._zones_payload(snapshot)
+            items = [(self.zones_topic, payload, True)]
+            items.extend(
+                (self.zone_topics[zone_id], ZONE_STATE_NAMES[snapshot[zone_id]], True) for zone_id in dirty_zones
+            )
+            self.publish_batch(items)
+        finally:
+            self._zone_publish_lock.release()
+        logging.info(f"Estados de zona publicados a MQTT: {payload}")
+
+    def publish_all_zone_states(self):
+        # No llamar con alarm_lock tomado.
+        with self.alarm_lock:
+            self._zone_publish_lock.acquire()
+            self.dirty_zones.clear()
+            snapshot = self._published_snapshot = self.zone_snapshot
+        try:
+            payload = self._zones_payload(snapshot)
+            items = [(self.zones_topic, payload, True)]
+            items.extend((topic, ZONE_STATE_NAMES[snapshot[zone_id]], True) for zone_id, topic in self.zone_topic_pairs)
+            self.publish_batch(items)
+        finally:
+            self._zone_publish_lock.release()
+        logging.info(f"Estados de zona publicados a MQTT: {payload}")
+
+    @staticmethod
+    def _changed_zone_ids(snapshot, published):
+        # XOR de las dos copias como enteros: los bytes distintos de cero son las
+        # zonas que cambiaron, sin comparar zona por zona en Python.
+        diff = int.from_bytes(snapshot, "little") ^ int.from_bytes(published, "little")
+        changed = []
+        while diff:
+            zone_id = ((diff & -diff).bit_length() - 1) >> 3
+            changed.append(zone_id)
+            diff &= ~(0xFF << (zone_id << 3))
+        return changed
+
+    def _zones_payload(self, snapshot):
+        return json.dumps({zone_id: ZONE_STATE_NAMES[snapshot[zone_id]] for zone_id, _ in self.zone_topic_pairs})
 
     def publish_triggered_zones_state(self):
-        triggered = self._current_triggered_zone_ids()
-        self.mqtt_client.publish(
-            f"{self.base_topic}/triggered_zones",
-            ",".join(triggered) if triggered else "Ninguna",
-            retain=True,
-        )
+        # No llamar con alarm_lock tomado (mismo orden de locks que publish_zone_states).
+        with self.alarm_lock:
+            self._zone_publish_lock.acquire()
+            triggered = self._current_triggered_zone_ids()
+        try:
+            self.publish_batch(
+                [(self.topics["triggered_zones"], ",".join(map(str, triggered)) if triggered else "Ninguna", True)]
+            )
+        finally:
+            self._zone_publish_lock.release()
+
+    def publish_batch(self, items):
+        # items: (tópico, payload, retain). Los retenidos que no cambiaron desde
+        # el último envío se omiten. No se usa paho.mqtt.publish.multiple: abre
+        # una conexión nueva por llamada. Con loop_start() el hilo de red de paho
+        # ya vacía en una pasada los paquetes encolados aquí bajo un solo lock.
+        with self._publish_lock:
+            for topic, payload, retain in items:
+                if retain:
+                    if self._last_published.get(topic) == payload:
+                        continue
+                    self._last_published[topic] = payload
+                self._publish(topic, payload, 1 if topic in self._qos1_topics else 0, retain)
+
+    def _publish(self, topic, payload, qos, retain):
+        # Debe llamarse con _publish_lock tomado. Los mensajes QoS 1 van siempre
+        # con el tópico completo: paho los reenvía tras reconectar y los alias
+        # de la conexión anterior ya no son válidos.
+        if qos or not self._topic_alias_max:
+            self._mqtt_publish(topic, payload, qos, retain)
+            return
+        properties = self._topic_aliases.get(topic)
+        if properties is not None:
+            # El bróker ya conoce el alias: se envía sin el tópico completo.
+            self._mqtt_publish("", payload, 0, retain, properties)
+            return
+        if len(self._topic_aliases) >= self._topic_alias_max:
+            self._mqtt_publish(topic, payload, 0, retain)
+            return
+        # Import diferido: solo hace falta con MQTT 5 y alias activos, y así el
+        # módulo se puede importar sin paho (p. ej. en las pruebas).
+        from paho.mqtt.packettypes import PacketTypes
+        from paho.mqtt.properties import Properties
 
-    def publish_offline(self):
-        self.mqtt_client.publish(self.availability_topic, "offline", retain=True)
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.TopicAlias = len(self._topic_aliases) + 1
+        self._topic_aliases[topic] = properties
+        self._mqtt_publish(topic, payload, 0, retain, properties)
+
+    def publish_offline(self, timeout=1.0):
+        # QoS 1 para poder esperar al ACK del bróker en lugar de dormir a ciegas.
+        message_info = self.mqtt_client.publish(self.availability_topic, "offline", qos=1, retain=True)
+        try:
+            message_info.wait_for_publish(timeout=timeout)
+        except (ValueError, RuntimeError) as exc:
+            logging.warning(f"No se pudo confirmar la publicación 'offline': {exc}")
 
     def on_connect(self, client, userdata, flags, reason_code, properties):
         if reason_code == 0:
             logging.info("Conectado a MQTT y suscrito.")
+            self._disable_nagle(client)
             client.subscribe(self.command_topic)
-            client.publish(self.availability_topic, "online", retain=True)
-            client.publish(f"{self.base_topic}/ac_power", "on", retain=True)
-            client.publish(f"{self.base_topic}/system_battery", "off", retain=True)
-            client.publish(f"{self.base_topic}/tamper", "off", retain=True)
-            client.publish(f"{self.base_topic}/panic", "off", retain=True)
-            client.publish(f"{self.base_topic}/triggered_zones", "Ninguna", retain=True)
-            client.publish(f"{self.base_topic}/partition_a_state", "OFF", retain=True)
-            client.publish(f"{self.base_topic}/partition_b_state", "OFF", retain=True)
-            client.publish(f"{self.base_topic}/partition_c_state", "OFF", retain=True)
-            client.publish(f"{self.base_topic}/partition_d_state", "OFF", retain=True)
-            self.publish_zone_states()
+            # El bróker puede haber perdido los retenidos: olvidar lo ya publicado.
+            # Los alias de tópico valen solo para la conexión en la que se crearon.
+            with self._publish_lock:
+                self._last_published.clear()
+                self._topic_aliases.clear()
+                self._topic_alias_max = getattr(properties, "TopicAliasMaximum", 0) if properties else 0
+            self.publish_batch([(topic, payload, True) for topic, payload in self.connect_defaults])
+            # Tras reconectar el bróker puede no tener los retenidos: republicar todo.
+            self.publish_all_zone_states()
         else:
             logging.error(f"Fallo al conectar a MQTT: {reason_code}")
 
@@ -72,8 +275,19 @@ class MQTTRuntime:
                 return
             protocol_handler.handle_command(command)
 
+    @staticmethod
+    def _disable_nagle(client):
+        # Sin Nagle las ráfagas de publicaciones pequeñas salen sin esperar al ACK.
+        sock = client.socket()
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, AttributeError) as exc:
+            logging.debug(f"No se pudo activar TCP_NODELAY en MQTT: {exc}")
+
     def _current_triggered_zone_ids(self):
-        return sorted(
-            [zone_id for zone_id, state in self.zone_states.items() if state == "Disparada"],
-            key=int,
-        )
+        return self.triggered_snapshot
+
+    def _sorted_zone_ids(self, zone_ids):
+        return tuple(sorted(zone_ids))
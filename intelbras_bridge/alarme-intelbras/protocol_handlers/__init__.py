@@ -20,10 +20,17 @@ def create_protocol_handler(
     password_length,
     mqtt_client,
     base_topic,
-    zone_states,
+    zone_ids,
+    get_zone_state,
     alarm_lock,
+    set_zone_state,
+    set_all_zone_states,
     publish_zone_states,
     publish_triggered_zones_state,
+    publish_batch,
+    polling_interval_seconds,
+    poll_jitter_pct,
+    scheduler,
 ):
     normalized = (protocol or "").lower()
     if normalized == "amt8000":
@@ -32,10 +39,15 @@ def create_protocol_handler(
             alarm_pass=alarm_pass,
             mqtt_client=mqtt_client,
             base_topic=base_topic,
-            zone_states=zone_states,
+            zone_ids=zone_ids,
+            get_zone_state=get_zone_state,
             alarm_lock=alarm_lock,
+            set_zone_state=set_zone_state,
+            set_all_zone_states=set_all_zone_states,
             publish_zone_states=publish_zone_states,
             publish_triggered_zones_state=publish_triggered_zones_state,
+            publish_batch=publish_batch,
+            scheduler=scheduler,
         )
 
     return ISECNetProtocolHandler(
@@ -43,6 +55,12 @@ def create_protocol_handler(
         alarm_port=alarm_port,
         mqtt_client=mqtt_client,
         base_topic=base_topic,
-        zone_states=zone_states,
+        zone_ids=zone_ids,
+        get_zone_state=get_zone_state,
         alarm_lock=alarm_lock,
+        set_zone_state=set_zone_state,
+        publish_zone_states=publish_zone_states,
+        publish_batch=publish_batch,
+        polling_interval_seconds=polling_interval_seconds,
+        poll_jitter_pct=poll_jitter_pct,
     )
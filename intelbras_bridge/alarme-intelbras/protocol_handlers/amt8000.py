@@ -1,38 +1,131 @@
 import logging
+import os
+import re
+import selectors
 import subprocess
 import threading
 import time
 
-from client import AuthError, CommunicationError
+from client import AuthError, CommunicationError, zone_open
+
+# Una sola búsqueda por línea de receptorip; el grupo con nombre indica el evento.
+# Patrones en bytes (UTF-8): se busca sobre la línea tal como sale del pipe.
+# Se aceptan los textos en portugués y los de alarmeitbl/tratador.py en español.
+_EVENT_RE = re.compile(
+    (
+        r"(?P<arm>Ativacao remota app|Activación remota app)"
+        r"|(?P<disarm>Desativacao remota app|Desactivación remota app)"
+        r"|(?P<panic>Panico|ánico)"
+        r"|(?P<ac_off>Falta de energia AC)"
+        r"|(?P<ac_on>Retorno de energia AC)"
+        r"|(?P<battery_ok>Recuperacao bateria do sistema baixa|Recuperación bateria del sistema baja)"
+        r"|(?P<battery_low>Bateria do sistema baixa|Bateria del sistema baja)"
+        r"|(?P<zone_triggered>Disparo de zona)"
+        r"|(?P<zone_restored>Restauracao de zona|Restauración de zona)"
+    ).encode()
+)
+# Eventos que actualizan lo mismo que el sondeo (zonas y batería); armado,
+# pánico o energía AC no lo sustituyen y no deben aplazarlo.
+_POLLED_STATE_EVENTS = frozenset({"zone_triggered", "zone_restored", "battery_low", "battery_ok"})
+# Se aplica justo después del evento: " 12" o " 24h 12" tras "... de zona".
+_ZONE_ID_RE = re.compile(rb"\s+(?:24h\s+)?(\d+)\b")
+
+# Comandos de particiones que la AMT8000 no admite por este protocolo.
+_UNSUPPORTED_COMMANDS = frozenset(
+    {
+        "ARM_HOME",
+        "ARM_NIGHT",
+        "ARM_VACATION",
+        "ARM_CUSTOM_BYPASS",
+        "ARM_PART_A",
+        "ARM_PART_B",
+        "ARM_PART_C",
+        "ARM_PART_D",
+        "DISARM_PART_A",
+        "DISARM_PART_B",
+        "DISARM_PART_C",
+        "DISARM_PART_D",
+    }
+)
+
+_BATTERY_PERCENTAGE = {"full": 100, "middle": 75, "low": 25, "dead": 0}
+_battery_percentage = _BATTERY_PERCENTAGE.get
 
 
 class AMT8000ProtocolHandler:
+    runs_own_polling = False
+
     def __init__(
         self,
         alarm_client,
         alarm_pass,
         mqtt_client,
         base_topic,
-        zone_states,
+        zone_ids,
+        get_zone_state,
         alarm_lock,
+        set_zone_state,
+        set_all_zone_states,
         publish_zone_states,
         publish_triggered_zones_state,
+        publish_batch,
+        scheduler,
     ):
         self.alarm_client = alarm_client
         self.alarm_pass = alarm_pass
         self.mqtt_client = mqtt_client
         self.base_topic = base_topic
-        self.zone_states = zone_states
+        # Tópicos precalculados una sola vez en lugar de formatearlos en cada publicación.
+        self.topics = {
+            name: f"{base_topic}/{name}"
+            for name in (
+                "ac_power",
+                "battery_percentage",
+                "model",
+                "panic",
+                "state",
+                "system_battery",
+                "tamper",
+                "triggered_zones",
+                "version",
+            )
+        }
+        self.zone_ids = zone_ids
+        self.get_zone_state = get_zone_state
         self.alarm_lock = alarm_lock
+        self.set_zone_state = set_zone_state
+        self.set_all_zone_states = set_all_zone_states
         self.publish_zone_states = publish_zone_states
         self.publish_triggered_zones_state = publish_triggered_zones_state
+        self.publish_batch = publish_batch
+        self.scheduler = scheduler
         self.receptorip_proc = None
+        # La conexión con la central se mantiene abierta y autenticada entre
+        # sondeos y comandos; solo se rehace tras un error.
+        self._session_valid = False
+        self._stop_reading = threading.Event()
+        # Momento (monotónico) del último evento de receptorip que refresca estado sondeado.
+        self.last_event_at = None
+        # Cada evento de pánico mueve el plazo; "off" solo sale al vencer el último.
+        self._panic_reset_at = None
 
         self._command_actions = {
             "ARM_AWAY": lambda: self.alarm_client.arm_system(0),
             "DISARM": lambda: self.alarm_client.disarm_system(0),
             "PANIC": lambda: self.alarm_client.panic(1),
         }
+        # Cada manejador acumula sus publicaciones y devuelve True si cambió alguna zona.
+        self._event_handlers = {
+            "arm": self._on_remote_arm,
+            "disarm": self._on_remote_disarm,
+            "panic": self._on_panic,
+            "ac_off": lambda match, publishes: self._append_publish(publishes, "ac_power", "off"),
+            "ac_on": lambda match, publishes: self._append_publish(publishes, "ac_power", "on"),
+            "battery_low": lambda match, publishes: self._append_publish(publishes, "system_battery", "on"),
+            "battery_ok": lambda match, publishes: self._append_publish(publishes, "system_battery", "off"),
+            "zone_triggered": self._on_zone_triggered,
+            "zone_restored": self._on_zone_restored,
+        }
 
     def validate_startup(self, alarm_ip, mqtt_broker):
         if not all([alarm_ip, self.alarm_pass, mqtt_broker]):
@@ -46,44 +139,32 @@ class AMT8000ProtocolHandler:
                 ["/alarme-intelbras/receptorip", "/alarme-intelbras/config.cfg"],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
+                bufsize=0,
             )
             threading.Thread(target=self._process_receptorip_output, daemon=True).start()
         except FileNotFoundError as exc:
             raise RuntimeError("No se encontró 'receptorip'.") from exc
 
     def connect_and_auth_alarm(self):
+        if self._session_valid and self.alarm_client.is_connected:
+            return True
+        self._session_valid = False
         for attempt in range(1, 4):
             try:
                 self.alarm_client.connect()
                 self.alarm_client.auth(self.alarm_pass)
+                self._session_valid = True
                 return True
             except (CommunicationError, AuthError) as exc:
+                self._invalidate_session()
                 logging.error(f"Fallo de conexión/auth (intento {attempt}/3): {exc}")
                 if attempt < 3:
                     time.sleep(1)
         return False
 
     def handle_command(self, command):
-        if not self.connect_and_auth_alarm():
-            logging.error("Fallo de auth, comando no ejecutado.")
-            return
-
-        if command in {
-            "ARM_HOME",
-            "ARM_NIGHT",
-            "ARM_VACATION",
-            "ARM_CUSTOM_BYPASS",
-            "ARM_PART_A",
-            "ARM_PART_B",
-            "ARM_PART_C",
-            "ARM_PART_D",
-            "DISARM_PART_A",
-            "DISARM_PART_B",
-            "DISARM_PART_C",
-            "DISARM_PART_D",
-        }:
+        # Se valida con búsquedas en tablas antes de abrir la conexión con la central.
+        if command in _UNSUPPORTED_COMMANDS:
             logging.warning(f"{command} no está soportado en protocolo amt8000.")
             return
 
@@ -92,11 +173,16 @@ class AMT8000ProtocolHandler:
             logging.warning(f"Comando no reconocido: {command}")
             return
 
+        if not self.connect_and_auth_alarm():
+            logging.error("Fallo de auth, comando no ejecutado.")
+            return
+
         try:
             if command == "PANIC":
                 logging.info("¡Activando pánico audible desde Home Assistant!")
             action()
         except (CommunicationError, AuthError) as exc:
+            self._invalidate_session()
             logging.error(f"Error de comunicación en comando: {exc}")
 
     def poll_status(self):
@@ -107,8 +193,10 @@ class AMT8000ProtocolHandler:
         try:
             logging.info("Sondeando estado de la central...")
             status = self.alarm_client.status()
-            self.mqtt_client.publish(f"{self.base_topic}/model", status.get("model", "Desconocido"), retain=True)
-            self.mqtt_client.publish(f"{self.base_topic}/version", status.get("version", "Desconocido"), retain=True)
+            items = [
+                (self.topics["model"], status.get("model", "Desconocido"), True),
+                (self.topics["version"], status.get("version", "Desconocido"), True),
+            ]
 
             amt8000_state = status.get("status", "unknown")
             state_map = {
@@ -118,96 +206,141 @@ class AMT8000ProtocolHandler:
             }
             mapped_state = state_map.get(amt8000_state)
             if mapped_state:
-                self.mqtt_client.publish(f"{self.base_topic}/state", mapped_state, retain=True)
+                items.append((self.topics["state"], mapped_state, True))
 
             triggered = "Desconocido" if status.get("zonesFiring") else "Ninguna"
-            self.mqtt_client.publish(f"{self.base_topic}/triggered_zones", triggered, retain=True)
+            items.append((self.topics["triggered_zones"], triggered, True))
 
             battery_level = self._map_battery_status_to_percentage(status.get("batteryStatus"))
-            self.mqtt_client.publish(f"{self.base_topic}/battery_percentage", battery_level, retain=True)
+            items.append((self.topics["battery_percentage"], battery_level, True))
 
             tamper_state = "on" if status.get("tamper", False) else "off"
-            self.mqtt_client.publish(f"{self.base_topic}/tamper", tamper_state, retain=True)
+            items.append((self.topics["tamper"], tamper_state, True))
+            self.publish_batch(items)
             logging.info(f"Publicados estados generales: Batería={battery_level}%, Tamper={tamper_state}")
 
-            zones = status.get("zones")
-            if isinstance(zones, dict):
-                for zone_id, new_state_str in zones.items():
-                    if zone_id in self.zone_states and self.zone_states.get(zone_id) != "Disparada":
-                        self.zone_states[zone_id] = "Abierta" if new_state_str == "open" else "Cerrada"
+            # Máscara de bits de zonas: solo se consultan las zonas configuradas.
+            zones_mask = status.get("zones_mask", 0)
+            zones_count = status.get("zones_count", 0)
+            for zone_id in self.zone_ids:
+                if zone_id <= zones_count and self.get_zone_state(zone_id) != "Disparada":
+                    self.set_zone_state(zone_id, "Abierta" if zone_open(zones_mask, zone_id) else "Cerrada")
         except (CommunicationError, AuthError) as exc:
+            self._invalidate_session()
             logging.warning(f"Error durante sondeo: {exc}.")
         except Exception:
             logging.exception("Error inesperado durante sondeo amt8000.")
 
     def shutdown(self):
+        self._stop_reading.set()
         if self.receptorip_proc and self.receptorip_proc.poll() is None:
             self.receptorip_proc.terminate()
         self.alarm_client.close()
 
+    def _invalidate_session(self):
+        self._session_valid = False
+        self.alarm_client.close()
+
     def _process_receptorip_output(self):
         if not self.receptorip_proc or self.receptorip_proc.stdout is None:
             return
 
-        for line in iter(self.receptorip_proc.stdout.readline, ''):
+        for line in self._iter_receptorip_lines():
             line = line.strip()
             if not line:
                 continue
 
-            logging.info(f"Evento (receptorip): {line}")
-            publish_required = False
-
-            with self.alarm_lock:
-                if "Ativacao remota app" in line:
-                    self.mqtt_client.publish(f"{self.base_topic}/state", "Armada", retain=True)
-                elif "Desativacao remota app" in line:
-                    self.mqtt_client.publish(f"{self.base_topic}/state", "Desarmada", retain=True)
-                    for zone_id in self.zone_states:
-                        self.zone_states[zone_id] = "Cerrada"
-                    self.publish_triggered_zones_state()
-                    publish_required = True
-                elif "Panico" in line:
-                    logging.info(f"¡Evento de pánico detectado: {line}!")
-                    self.mqtt_client.publish(f"{self.base_topic}/panic", "on", retain=False)
-                    threading.Timer(
-                        30.0,
-                        lambda: self.mqtt_client.publish(f"{self.base_topic}/panic", "off", retain=False),
-                    ).start()
-                elif "Falta de energia AC" in line:
-                    self.mqtt_client.publish(f"{self.base_topic}/ac_power", "off", retain=True)
-                elif "Retorno de energia AC" in line:
-                    self.mqtt_client.publish(f"{self.base_topic}/ac_power", "on", retain=True)
-                elif "Bateria do sistema baixa" in line:
-                    self.mqtt_client.publish(f"{self.base_topic}/system_battery", "on", retain=True)
-                elif "Recuperacao bateria do sistema baixa" in line:
-                    self.mqtt_client.publish(f"{self.base_topic}/system_battery", "off", retain=True)
-                elif "Disparo de zona" in line:
-                    try:
-                        zone_id = line.split()[-1]
-                        if zone_id in self.zone_states:
-                            self.zone_states[zone_id] = "Disparada"
-                            self.mqtt_client.publish(f"{self.base_topic}/state", "Disparada", retain=True)
-                            self.publish_triggered_zones_state()
-                            logging.info(f"Panel de alarma puesto en estado 'Disparada' debido a zona {zone_id}")
-                            publish_required = True
-                    except (ValueError, IndexError):
-                        logging.warning(f"No se pudo extraer ID de zona de: {line}")
-                elif "Restauracao de zona" in line:
-                    try:
-                        zone_id = line.split()[-1]
-                        if zone_id in self.zone_states:
-                            self.zone_states[zone_id] = "Cerrada"
-                            self.publish_triggered_zones_state()
-                            publish_required = True
-                    except (ValueError, IndexError):
-                        logging.warning(f"No se pudo extraer ID de zona de: {line}")
+            logging.info(f"Evento (receptorip): {line.decode(errors='replace')}")
+            match = _EVENT_RE.search(line)
+            if not match:
+                continue
+            if match.lastgroup in _POLLED_STATE_EVENTS:
+                self.last_event_at = time.monotonic()
+
+            # El lock solo protege el estado de las zonas; las publicaciones se acumulan y
+            # se envían después de liberarlo.
+            publishes = []
+            publish_required = self._event_handlers[match.lastgroup](match, publishes)
 
+            self.publish_batch(publishes)
             if publish_required:
-                with self.alarm_lock:
-                    self.publish_zone_states()
+                self.publish_triggered_zones_state()
+                self.publish_zone_states()
 
         logging.warning("Proceso 'receptorip' terminado.")
 
+    def _iter_receptorip_lines(self):
+        # Lee el pipe en bloques y separa las líneas a mano: una llamada al
+        # sistema por ráfaga de eventos en lugar de una por línea. La espera se
+        # hace con select y un timeout para poder salir al cerrar el addon
+        # aunque receptorip no cierre su salida.
+        fd = self.receptorip_proc.stdout.fileno()
+        pending = b""
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while not self._stop_reading.is_set():
+                if not selector.select(timeout=1.0):
+                    continue
+                chunk = os.read(fd, 8192)
+                if not chunk:
+                    break
+                *lines, pending = (pending + chunk).split(b"\n")
+                yield from lines
+        if pending:
+            yield pending
+
+    def _append_publish(self, publishes, topic_name, payload, retain=True):
+        publishes.append((self.topics[topic_name], payload, retain))
+        return False
+
+    def _on_remote_arm(self, match, publishes):
+        return self._append_publish(publishes, "state", "Armada")
+
+    def _on_remote_disarm(self, match, publishes):
+        self._append_publish(publishes, "state", "Desarmada")
+        with self.alarm_lock:
+            self.set_all_zone_states("Cerrada")
+        return True
+
+    def _on_panic(self, match, publishes):
+        logging.info(f"¡Evento de pánico detectado: {match.string.decode(errors='replace')}!")
+        self._panic_reset_at = time.monotonic() + 30.0
+        self.scheduler.schedule_after(30.0, self._reset_panic)
+        return self._append_publish(publishes, "panic", "on", retain=False)
+
+    def _reset_panic(self):
+        if self._panic_reset_at is not None and time.monotonic() >= self._panic_reset_at:
+            self._panic_reset_at = None
+            self.publish_batch([(self.topics["panic"], "off", False)])
+
+    def _on_zone_triggered(self, match, publishes):
+        zone_id = self._extract_zone_id(match)
+        if zone_id is None:
+            return False
+        with self.alarm_lock:
+            self.set_zone_state(zone_id, "Disparada")
+        self._append_publish(publishes, "state", "Disparada")
+        logging.info(f"Panel de alarma puesto en estado 'Disparada' debido a zona {zone_id}")
+        return True
+
+    def _on_zone_restored(self, match, publishes):
+        zone_id = self._extract_zone_id(match)
+        if zone_id is None:
+            return False
+        with self.alarm_lock:
+            self.set_zone_state(zone_id, "Cerrada")
+        return True
+
+    def _extract_zone_id(self, event_match):
+        # Continúa desde el final del evento en vez de volver a recorrer la línea.
+        match = _ZONE_ID_RE.match(event_match.string, event_match.end())
+        if not match:
+            logging.warning(f"No se pudo extraer ID de zona de: {event_match.string.decode(errors='replace')}")
+            return None
+        # Única conversión a int: desde aquí las zonas se identifican por número.
+        zone_id = int(match.group(1))
+        return zone_id if zone_id in self.zone_ids else None
+
     @staticmethod
     def _map_battery_status_to_percentage(status):
-        return {"full": 100, "middle": 75, "low": 25, "dead": 0}.get(status, 0)
+        return _battery_percentage(status, 0)
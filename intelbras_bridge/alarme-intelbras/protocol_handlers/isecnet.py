@@ -1,5 +1,7 @@
 import asyncio
+import functools
 import logging
+import random
 import threading
 
 from client import CommunicationError
@@ -16,6 +18,8 @@ from isecnet.const import ResponseCode
 
 class ISECNetProtocolHandler:
     uses_receptorip = False
+    # El sondeo corre como tarea dentro del loop asyncio del servidor.
+    runs_own_polling = True
 
     def __init__(
         self,
@@ -23,36 +27,79 @@ class ISECNetProtocolHandler:
         alarm_port,
         mqtt_client,
         base_topic,
-        zone_states,
+        zone_ids,
+        get_zone_state,
         alarm_lock,
+        set_zone_state,
+        publish_zone_states,
+        publish_batch,
+        polling_interval_seconds,
+        poll_jitter_pct,
     ):
         self.alarm_pass = alarm_pass
         self.alarm_port = alarm_port
         self.mqtt_client = mqtt_client
         self.base_topic = base_topic
-        self.zone_states = zone_states
+        # Tópicos precalculados una sola vez en lugar de formatearlos en cada publicación.
+        self.topics = {
+            name: f"{base_topic}/{name}"
+            for name in (
+                "ac_power",
+                "alarm_memory",
+                "battery_percentage",
+                "model",
+                "partition_a_state",
+                "partition_b_state",
+                "partition_c_state",
+                "partition_d_state",
+                "state",
+                "system_battery",
+                "tamper",
+                "triggered_zones",
+                "version",
+            )
+        }
+        self.zone_ids = zone_ids
+        self.get_zone_state = get_zone_state
         self.alarm_lock = alarm_lock
+        self.set_zone_state = set_zone_state
+        self.publish_zone_states = publish_zone_states
+        self.publish_batch = publish_batch
+        self.polling_interval_seconds = polling_interval_seconds
+        self.poll_jitter = poll_jitter_pct / 100
+        # ISECNet no recibe eventos espontáneos: el sondeo es la única fuente de estado.
+        self.last_event_at = None
 
         self.server = None
         self.loop = None
         self.thread = None
         self.connection_id = None
-
+        # Creados dentro del loop: cola de comandos MQTT y exclusión de petición/respuesta.
+        self._command_queue = None
+        self._io_lock = None
+        self._tasks = set()
+        # Frames ISECNet precalculados en start(): la contraseña no cambia en ejecución.
+        self._status_frame = None
+        self._siren_on_frame = None
+        self._siren_off_frame = None
+        self._command_frames = {}
+
+        # Cada acción construye el comando; start() guarda su frame ya serializado.
         self._command_actions = {
-            "ARM_AWAY": lambda: self._send_command(ActivationCommand.arm_all(self.alarm_pass)),
-            "ARM_HOME": lambda: self._send_command(ActivationCommand.arm_partition_a(self.alarm_pass)),
-            "ARM_NIGHT": lambda: self._send_command(ActivationCommand.arm_partition_b(self.alarm_pass)),
-            "ARM_VACATION": lambda: self._send_command(ActivationCommand.arm_partition_c(self.alarm_pass)),
-            "ARM_CUSTOM_BYPASS": lambda: self._send_command(ActivationCommand.arm_partition_d(self.alarm_pass)),
-            "ARM_PART_A": lambda: self._send_command(ActivationCommand.arm_partition_a(self.alarm_pass)),
-            "ARM_PART_B": lambda: self._send_command(ActivationCommand.arm_partition_b(self.alarm_pass)),
-            "ARM_PART_C": lambda: self._send_command(ActivationCommand.arm_partition_c(self.alarm_pass)),
-            "ARM_PART_D": lambda: self._send_command(ActivationCommand.arm_partition_d(self.alarm_pass)),
-            "DISARM_PART_A": lambda: self._send_command(DeactivationCommand.disarm_partition_a(self.alarm_pass)),
-            "DISARM_PART_B": lambda: self._send_command(DeactivationCommand.disarm_partition_b(self.alarm_pass)),
-            "DISARM_PART_C": lambda: self._send_command(DeactivationCommand.disarm_partition_c(self.alarm_pass)),
-            "DISARM_PART_D": lambda: self._send_command(DeactivationCommand.disarm_partition_d(self.alarm_pass)),
-            "DISARM": lambda: self._send_command(DeactivationCommand.disarm_all(self.alarm_pass)),
+            "ARM_AWAY": lambda: ActivationCommand.arm_all(self.alarm_pass),
+            "ARM_HOME": lambda: ActivationCommand.arm_partition_a(self.alarm_pass),
+            "ARM_NIGHT": lambda: ActivationCommand.arm_partition_b(self.alarm_pass),
+            "ARM_VACATION": lambda: ActivationCommand.arm_partition_c(self.alarm_pass),
+            "ARM_CUSTOM_BYPASS": lambda: ActivationCommand.arm_partition_d(self.alarm_pass),
+            "ARM_PART_A": lambda: ActivationCommand.arm_partition_a(self.alarm_pass),
+            "ARM_PART_B": lambda: ActivationCommand.arm_partition_b(self.alarm_pass),
+            "ARM_PART_C": lambda: ActivationCommand.arm_partition_c(self.alarm_pass),
+            "ARM_PART_D": lambda: ActivationCommand.arm_partition_d(self.alarm_pass),
+            "DISARM_PART_A": lambda: DeactivationCommand.disarm_partition_a(self.alarm_pass),
+            "DISARM_PART_B": lambda: DeactivationCommand.disarm_partition_b(self.alarm_pass),
+            "DISARM_PART_C": lambda: DeactivationCommand.disarm_partition_c(self.alarm_pass),
+            "DISARM_PART_D": lambda: DeactivationCommand.disarm_partition_d(self.alarm_pass),
+            "DISARM": lambda: DeactivationCommand.disarm_all(self.alarm_pass),
         }
         self._command_aliases = {
             "ARM_PARTITION_A": "ARM_PART_A",
@@ -87,6 +134,7 @@ class ISECNetProtocolHandler:
         if self.server is not None:
             return
 
+        self._build_frames()
         config = AMTServerConfig(host="0.0.0.0", port=self.alarm_port, auto_ack_heartbeat=True, auto_ack_connection=True)
         self.server = AMTServer(config)
 
@@ -94,7 +142,7 @@ class ISECNetProtocolHandler:
         async def _on_connect(conn):
             self.connection_id = conn.id
             logging.info(f"Central AMT conectada (ISECNet): {conn.id}")
-            threading.Thread(target=self._poll_status_after_connect, daemon=True).start()
+            self._spawn(self._poll_status())
 
         @self.server.on_disconnect
         async def _on_disconnect(conn):
@@ -102,23 +150,32 @@ class ISECNetProtocolHandler:
                 self.connection_id = None
             logging.warning(f"Central AMT desconectada (ISECNet): {conn.id}")
 
-        @self.server.on_frame
-        async def _on_frame(conn, frame):
-            if not frame.is_heartbeat:
-                logging.debug(f"Frame ISECNet recibido: cmd=0x{frame.command:02X} data={frame.content.hex()}")
+        # Solo sirve para depurar: sin DEBUG no se registra y los heartbeats
+        # (confirmados por el servidor) no ejecutan ningún callback.
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+
+            @self.server.on_frame
+            async def _on_frame(conn, frame):
+                if not frame.is_heartbeat:
+                    logging.debug(f"Frame ISECNet recibido: cmd=0x{frame.command:02X} data={frame.content.hex()}")
 
         self.loop = asyncio.new_event_loop()
         self.thread = threading.Thread(target=self._run_server, daemon=True)
         self.thread.start()
 
     def poll_status(self):
+        # Solo programa un sondeo en el loop; no bloquea al llamador.
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._spawn, self._poll_status())
+
+    async def _poll_status(self):
         if not self._ensure_connected():
             logging.warning("Sondeo omitido, no hay conexión ISECNet.")
             return
 
         try:
             logging.info("Sondeando estado de la central (ISECNet)...")
-            response = self._send_command(StatusRequestCommand(self.alarm_pass))
+            response = await self._send_command(self._status_frame)
             if not response:
                 logging.warning("Respuesta ISECNet vacía.")
                 return
@@ -128,7 +185,7 @@ class ISECNetProtocolHandler:
                 return
 
             raw_content = response.raw_frame.content if response.raw_frame else b""
-            if raw_content:
+            if raw_content and logging.getLogger().isEnabledFor(logging.DEBUG):
                 logging.debug(f"ISECNet status raw content len={len(raw_content)}")
 
             if raw_content and raw_content[0] == 0xFE and len(raw_content) > 1:
@@ -142,19 +199,53 @@ class ISECNetProtocolHandler:
                 return
 
             self._publish_status(status)
-            for zone_key in self.zone_states:
-                zone_id = int(zone_key)
-                zone_key = str(zone_id)
-                if zone_id in status.zones.violated_zones:
-                    self.zone_states[str(zone_id)] = "Disparada"
-                elif zone_id in status.zones.open_zones:
-                    self.zone_states[str(zone_id)] = "Abierta"
-                elif self.zone_states.get(zone_key) != "Disparada":
-                    self.zone_states[str(zone_id)] = "Cerrada"
-        except Exception as exc:
+            # _parse_bitmask ya devuelve sets: búsquedas O(1) y una sola escritura por zona.
+            violated = status.zones.violated_zones
+            opened = status.zones.open_zones
+            set_zone_state = self.set_zone_state
+            with self.alarm_lock:
+                for zone_id in self.zone_ids:
+                    if zone_id in violated:
+                        new_state = "Disparada"
+                    elif zone_id in opened:
+                        new_state = "Abierta"
+                    elif self.get_zone_state(zone_id) != "Disparada":
+                        new_state = "Cerrada"
+                    else:
+                        continue
+                    set_zone_state(zone_id, new_state)
+            self.publish_zone_states()
+        except (CommunicationError, asyncio.TimeoutError, OSError, ValueError) as exc:
+            # Fallos de red esperables (la central se desconecta o no responde):
+            # aviso sin traza. ValueError: la conexión desapareció antes del envío.
             logging.warning(f"Error durante sondeo ISECNet: {exc}.")
+        except Exception:
+            # Un error de programación no debe pasar desapercibido, pero tampoco
+            # detener la tarea de sondeo periódico.
+            logging.exception("Error inesperado durante sondeo ISECNet.")
+
+    async def _status_polling_loop(self):
+        logging.info(f"Iniciando sondeo ISECNet cada {self.polling_interval_seconds // 60} minutos.")
+        next_deadline = self.loop.time()
+        while True:
+            await self._poll_status()
+            interval = self._jittered(self.polling_interval_seconds)
+            next_deadline = max(next_deadline + interval, self.loop.time())
+            await asyncio.sleep(next_deadline - self.loop.time())
 
     def handle_command(self, command):
+        # Llamado desde el hilo de MQTT: solo encola, la ejecución ocurre en el loop.
+        if self.loop is None or self._command_queue is None:
+            logging.error("Servidor ISECNet no iniciado, comando no ejecutado.")
+            return
+        self.loop.call_soon_threadsafe(self._command_queue.put_nowait, command)
+
+    async def _command_worker(self):
+        while True:
+            command = await self._command_queue.get()
+            await self._execute_command(command)
+
+    async def _execute_command(self, command):
         command_key = self._normalize_command(command)
         if not self._ensure_connected():
             logging.error("No hay conexión ISECNet activa, comando no ejecutado.")
@@ -163,27 +254,27 @@ class ISECNetProtocolHandler:
         try:
             if command_key == "PANIC":
                 logging.info("¡Activando pánico audible desde Home Assistant!")
-                self._send_command(SirenCommand.turn_on_siren(self.alarm_pass))
-                self._schedule_siren_off(30.0)
+                await self._send_command(self._siren_on_frame)
+                self._spawn(self._turn_off_siren_later(self._jittered(30.0)))
                 return
 
-            action = self._command_actions.get(command_key)
-            if action is None:
+            frame = self._command_frames.get(command_key)
+            if frame is None:
                 logging.warning(f"Comando no reconocido: {command}")
                 return
 
-            response = action()
+            response = await self._send_command(frame)
             if response and response.is_error:
                 logging.warning(
                     f"ISECNet rechazó comando {command_key}: {response.message} "
                     f"(0x{response.code:02X})"
                 )
                 if response.code == ResponseCode.NACK_NOT_PARTITIONED:
-                    self._try_not_partitioned_fallback(command_key)
+                    await self._try_not_partitioned_fallback(command_key)
                 return
 
             logging.info(f"Comando ejecutado por ISECNet: {command_key}")
-            self.poll_status()
+            await self._poll_status()
         except CommunicationError as exc:
             logging.error(f"Error de comunicación en comando: {exc}")
         except Exception as exc:
@@ -207,61 +298,74 @@ class ISECNetProtocolHandler:
 
     def _run_server(self):
         asyncio.set_event_loop(self.loop)
+        self._command_queue = asyncio.Queue()
+        self._io_lock = asyncio.Lock()
         self.loop.run_until_complete(self.server.start())
+        self._spawn(self._command_worker())
+        self._spawn(self._status_polling_loop())
         self.loop.run_forever()
 
-    def _poll_status_after_connect(self):
-        with self.alarm_lock:
-            self.poll_status()
+    def _build_frames(self):
+        # Se llama tras validate_startup: construir el frame valida la contraseña.
+        self._status_frame = StatusRequestCommand(self.alarm_pass).build_net_frame()
+        self._siren_on_frame = SirenCommand.turn_on_siren(self.alarm_pass).build_net_frame()
+        self._siren_off_frame = SirenCommand.turn_off_siren(self.alarm_pass).build_net_frame()
+        self._command_frames = {
+            command_key: action().build_net_frame() for command_key, action in self._command_actions.items()
+        }
+
+    def _spawn(self, coro):
+        # Mantiene referencia a la tarea para que no sea recolectada antes de terminar.
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _jittered(self, seconds):
+        return seconds * random.uniform(1 - self.poll_jitter, 1 + self.poll_jitter)
 
     def _ensure_connected(self):
         return self.connection_id is not None
 
-    def _send_command(self, command_obj):
+    async def _send_command(self, frame):
         if not self.server or not self.loop:
             raise CommunicationError("ISECNet server not running")
         if not self.connection_id:
             raise CommunicationError("No ISECNet connection available")
 
-        future = asyncio.run_coroutine_threadsafe(
-            self.server.send_command(
+        # La conexión admite una sola respuesta pendiente: serializar peticiones.
+        async with self._io_lock:
+            return await self.server.send_command(
                 self.connection_id,
-                command_obj.build_net_frame(),
+                frame,
                 wait_response=True,
-            ),
-            self.loop,
-        )
-        return future.result(timeout=10)
-
-    def _schedule_siren_off(self, delay_seconds=30.0):
-        def _safe_turn_off():
-            with self.alarm_lock:
-                try:
-                    if not self._ensure_connected():
-                        logging.warning("No hay conexión ISECNet para apagar la sirena automáticamente.")
-                        return
-                    self._send_command(SirenCommand.turn_off_siren(self.alarm_pass))
-                except Exception as exc:
-                    logging.warning(f"No se pudo apagar la sirena automáticamente: {exc}")
+            )
 
-        threading.Timer(delay_seconds, _safe_turn_off).start()
+    async def _turn_off_siren_later(self, delay_seconds):
+        await asyncio.sleep(delay_seconds)
+        try:
+            if not self._ensure_connected():
+                logging.warning("No hay conexión ISECNet para apagar la sirena automáticamente.")
+                return
+            await self._send_command(self._siren_off_frame)
+        except Exception as exc:
+            logging.warning(f"No se pudo apagar la sirena automáticamente: {exc}")
 
     def _normalize_command(self, command):
         key = str(command).strip().upper().replace("-", "_").replace(" ", "_")
         return self._command_aliases.get(key, key)
 
-    def _try_not_partitioned_fallback(self, command_key):
+    async def _try_not_partitioned_fallback(self, command_key):
         fallback_key = self._partition_fallback_commands.get(command_key)
         if not fallback_key:
             return
-        fallback_action = self._command_actions.get(fallback_key)
-        if fallback_action is None:
+        fallback_frame = self._command_frames.get(fallback_key)
+        if fallback_frame is None:
             return
 
         logging.info(
             f"Reintentando comando en modo no particionado: {command_key} -> {fallback_key}"
         )
-        fallback_response = fallback_action()
+        fallback_response = await self._send_command(fallback_frame)
         if fallback_response and fallback_response.is_error:
             logging.warning(
                 f"Fallback ISECNet también rechazado: {fallback_response.message} "
@@ -269,34 +373,36 @@ class ISECNetProtocolHandler:
             )
             return
         logging.info(f"Fallback ejecutado por ISECNet: {fallback_key}")
-        self.poll_status()
+        await self._poll_status()
 
     def _publish_status(self, status):
-        self.mqtt_client.publish(f"{self.base_topic}/model", self._model_name(status.model), retain=True)
-        self.mqtt_client.publish(f"{self.base_topic}/version", status.firmware_version or "Desconocido", retain=True)
+        items = [
+            (self.topics["model"], self._model_name(status.model), True),
+            (self.topics["version"], status.firmware_version or "Desconocido", True),
+        ]
 
         battery_level = self._battery_percentage(status)
-        self.mqtt_client.publish(f"{self.base_topic}/battery_percentage", battery_level, retain=True)
+        items.append((self.topics["battery_percentage"], battery_level, True))
 
         tamper_state = "on" if (status.zones.tamper_zones or status.problems.keyboard_tamper) else "off"
-        self.mqtt_client.publish(f"{self.base_topic}/tamper", tamper_state, retain=True)
+        items.append((self.topics["tamper"], tamper_state, True))
 
         ac_power_state = "off" if status.problems.ac_failure else "on"
-        self.mqtt_client.publish(f"{self.base_topic}/ac_power", ac_power_state, retain=True)
+        items.append((self.topics["ac_power"], ac_power_state, True))
 
         system_battery_state = "on" if (
             status.problems.low_battery or status.problems.battery_absent or status.problems.battery_short
         ) else "off"
-        self.mqtt_client.publish(f"{self.base_topic}/system_battery", system_battery_state, retain=True)
+        items.append((self.topics["system_battery"], system_battery_state, True))
 
         alarm_active = status.armed
         alarm_triggered_now = bool(status.siren_on or status.zones.violated_zones)
         alarm_memory = bool(status.triggered)
-        self.mqtt_client.publish(f"{self.base_topic}/alarm_memory", "on" if alarm_memory else "off", retain=True)
+        items.append((self.topics["alarm_memory"], "on" if alarm_memory else "off", True))
 
         violated_list = sorted(status.zones.violated_zones)
         triggered_zones = ",".join(str(zone) for zone in violated_list) if violated_list else "Ninguna"
-        self.mqtt_client.publish(f"{self.base_topic}/triggered_zones", triggered_zones, retain=True)
+        items.append((self.topics["triggered_zones"], triggered_zones, True))
 
         if status.partitions.partitions_enabled:
             if status.partitions.all_armed:
@@ -315,25 +421,28 @@ class ISECNetProtocolHandler:
             global_state = "ON" if status.armed else "OFF"
             part_a = part_b = part_c = part_d = global_state
 
-        self.mqtt_client.publish(f"{self.base_topic}/partition_a_state", part_a, retain=True)
-        self.mqtt_client.publish(f"{self.base_topic}/partition_b_state", part_b, retain=True)
-        self.mqtt_client.publish(f"{self.base_topic}/partition_c_state", part_c, retain=True)
-        self.mqtt_client.publish(f"{self.base_topic}/partition_d_state", part_d, retain=True)
+        items.append((self.topics["partition_a_state"], part_a, True))
+        items.append((self.topics["partition_b_state"], part_b, True))
+        items.append((self.topics["partition_c_state"], part_c, True))
+        items.append((self.topics["partition_d_state"], part_d, True))
 
         if alarm_active and alarm_triggered_now:
-            self.mqtt_client.publish(f"{self.base_topic}/state", "Disparada", retain=True)
+            items.append((self.topics["state"], "Disparada", True))
         elif status.armed:
             if status.partitions.partitions_enabled:
                 if status.partitions.all_armed:
-                    self.mqtt_client.publish(f"{self.base_topic}/state", "Armada", retain=True)
+                    items.append((self.topics["state"], "Armada", True))
                 else:
-                    self.mqtt_client.publish(f"{self.base_topic}/state", "Armada Parcial", retain=True)
+                    items.append((self.topics["state"], "Armada Parcial", True))
             else:
-                self.mqtt_client.publish(f"{self.base_topic}/state", "Armada", retain=True)
+                items.append((self.topics["state"], "Armada", True))
         else:
-            self.mqtt_client.publish(f"{self.base_topic}/state", "Desarmada", retain=True)
+            items.append((self.topics["state"], "Desarmada", True))
+
+        self.publish_batch(items)
 
     @staticmethod
+    @functools.lru_cache(maxsize=4)
     def _model_name(model_code):
         if model_code == 0x41:
             return "AMT-4010"
@@ -0,0 +1,46 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class Scheduler:
+    """Un único hilo que ejecuta callbacks diferidos en lugar de un threading.Timer por evento."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cv = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._cv.notify()
+
+    def schedule_after(self, delay_seconds, callback):
+        with self._cv:
+            # El contador desempata plazos iguales sin comparar los callbacks.
+            heapq.heappush(self._heap, (time.monotonic() + delay_seconds, next(self._counter), callback))
+            self._cv.notify()
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cv.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception:
+                logging.exception("Error en tarea programada.")
@@ -33,7 +33,9 @@ if [[ "${ALARM_PROTOCOL}" == "legacy" || "${ALARM_PROTOCOL}" == "amt800" ]]; the
     export ALARM_PROTOCOL="amt8000"
 fi
 export MQTT_BROKER=$(config 'mqtt_broker'); export MQTT_PORT=$(config 'mqtt_port'); export MQTT_USER=$(config 'mqtt_user'); export MQTT_PASS=$(config 'mqtt_password')
+export MQTT_PROTOCOL=$(config 'mqtt_protocol' '3.1.1')
 export POLLING_INTERVAL_MINUTES=$(config 'polling_interval_minutes' 5)
+export POLL_JITTER_PCT=$(config 'poll_jitter_pct' 10)
 export ZONE_COUNT=$(config 'zone_count' 0)
 export ZONE_RANGE=$(config 'zone_range')
 export ZONE_NAMES=$(config 'zone_names' '{}')
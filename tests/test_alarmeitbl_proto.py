@@ -0,0 +1,214 @@
+import select
+import struct
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+
+from tests import _path  # noqa: F401
+from alarmeitbl.comandos import SolicitarStatus
+from alarmeitbl.myeventloop import Log, Timeout
+from alarmeitbl.obtem_fotos import ObtemFotosDeEvento
+from alarmeitbl.tratador_fotos import TratadorDeFotos
+from alarmeitbl.utils_proto import PACOTE_ISECNET2_BYE, PACOTE_ISECNET2_STATUS, UtilsProtocolo
+
+# Packets as produced by the previous list-based implementation.
+OLD_AUTH_4_DIGITS = [0, 0, 143, 255, 0, 8, 240, 240, 2, 1, 2, 3, 4, 16, 145]
+OLD_AUTH_6_DIGITS = [0, 0, 143, 255, 0, 10, 240, 240, 2, 5, 10, 6, 10, 7, 10, 16, 153]
+OLD_BYE = [0, 0, 143, 255, 0, 2, 240, 241, 140]
+OLD_STATUS = [0, 0, 143, 255, 0, 2, 11, 74, 204]
+OLD_ARM_ALL = [0, 0, 143, 255, 0, 4, 64, 30, 255, 1, 43]
+
+
+def old_bits_para_numeros(octetos, inverso=False):
+    lista = []
+    for i, octeto in enumerate(octetos):
+        for j in range(0, 8):
+            bit = octeto & (1 << j)
+            if (bit and not inverso) or (not bit and inverso):
+                lista.append("%d" % (1 + j + i * 8))
+    return ", ".join(lista)
+
+
+class PacoteISECNet2Tests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.utils = UtilsProtocolo()
+
+    def test_auth_packets_match_list_output(self) -> None:
+        self.assertEqual(self.utils.pacote_isecnet2_auth(1234, 4), bytes(OLD_AUTH_4_DIGITS))
+        self.assertEqual(self.utils.pacote_isecnet2_auth(506070, 6), bytes(OLD_AUTH_6_DIGITS))
+
+    def test_fixed_packets_match_list_output(self) -> None:
+        self.assertEqual(self.utils.pacote_isecnet2_bye(), bytes(OLD_BYE))
+        self.assertEqual(PACOTE_ISECNET2_BYE, bytes(OLD_BYE))
+        self.assertEqual(PACOTE_ISECNET2_STATUS, bytes(OLD_STATUS))
+        self.assertEqual(self.utils.pacote_isecnet2(0x401e, b"\xff\x01"), bytes(OLD_ARM_ALL))
+
+    def test_packet_roundtrip(self) -> None:
+        pct = self.utils.pacote_isecnet2(0x0bb0, b"\x00\x07\x01\x02")
+        self.assertEqual(self.utils.pacote_isecnet2_completo(pct + b"\x99"), len(pct))
+        self.assertEqual(self.utils.pacote_isecnet2_completo(pct[:-1]), 0)
+        self.assertTrue(self.utils.pacote_isecnet2_correto(pct))
+        self.assertEqual(self.utils.pacote_isecnet2_parse(pct), (0x0bb0, b"\x00\x07\x01\x02"))
+
+    def test_be16(self) -> None:
+        for n in (0, 1, 0xff, 0x100, 0x8fff, 0xffff):
+            self.assertEqual(self.utils.be16(n), bytes([n // 256, n % 256]))
+            self.assertEqual(self.utils.parse_be16(self.utils.be16(n)), n)
+        self.assertEqual(self.utils.parse_be16(b"\x00\x12\x34", 1), 0x1234)
+
+
+class BitsParaNumerosTests(unittest.TestCase):
+    def check(self, octetos, inverso=False) -> None:
+        self.assertEqual(
+            SolicitarStatus.bits_para_numeros(None, octetos, inverso),
+            old_bits_para_numeros(octetos, inverso),
+        )
+
+    def test_edge_values(self) -> None:
+        for octetos in ([0] * 8, [0xff] * 8, [0, 0, 0, 0, 0, 0, 0, 0x80], [0x01], [0x80, 0x01], []):
+            with self.subTest(octetos=octetos):
+                self.check(octetos)
+                self.check(octetos, inverso=True)
+
+    def test_known_values(self) -> None:
+        self.assertEqual(SolicitarStatus.bits_para_numeros(None, [0] * 8), "")
+        self.assertEqual(SolicitarStatus.bits_para_numeros(None, [0, 0, 0, 0, 0, 0, 0, 0x80]), "64")
+        self.assertEqual(SolicitarStatus.bits_para_numeros(None, [0x05, 0x80]), "1, 3, 16")
+
+
+class FakeTimeout:
+    def restart(self) -> None:
+        pass
+
+
+class FakeObserver:
+    def proxima_foto(self, ip_addr):
+        return None
+
+
+class FragmentWindowTests(unittest.TestCase):
+    FRAG_HDR = struct.Struct(">HBBBB")
+
+    def setUp(self) -> None:
+        level = Log.log_level
+        Log.set_level(Log.ERROR)
+        self.addCleanup(Log.set_level, level)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+
+        # Handler without a socket: outgoing requests are recorded instead of sent.
+        handler = ObtemFotosDeEvento.__new__(ObtemFotosDeEvento)
+        handler.label = "test"
+        handler.ip_addr = "192.168.1.50"
+        handler.indice = 7
+        handler.nrfoto = 0
+        handler.folder = folder.name
+        handler.archivo = ""
+        handler.gravacao = None
+        handler.status = 2
+        handler.observer = FakeObserver()
+        handler.conn_timeout = FakeTimeout()
+        handler.requests = []
+        handler.envia_comando = lambda cmd, payload, tratador: handler.requests.append(payload[3])
+        handler.despedida = lambda: setattr(handler, "status", 0)
+        handler.destroy = lambda: self.fail("destroy() called")
+        self.handler = handler
+
+    def respond(self, fragmento, nr_fragmentos, data) -> None:
+        payload = self.FRAG_HDR.pack(7, 0, 1, fragmento, nr_fragmentos) + data
+        self.handler.resposta_comando_in(payload)
+
+    def test_window_and_out_of_order_assembly(self) -> None:
+        fragments = {n: bytes([n]) * (10 + n) for n in range(1, 7)}
+        self.handler.envia_comando_in()
+        # Total is unknown until the first reply: only fragment 1 is requested.
+        self.assertEqual(self.handler.requests, [1])
+
+        self.respond(1, 6, fragments[1])
+        self.assertEqual(self.handler.requests, [1, 2, 3, 4, 5])
+
+        self.respond(3, 6, fragments[3])
+        self.assertEqual(self.handler.requests, [1, 2, 3, 4, 5, 6])
+        self.respond(2, 6, fragments[2])
+        self.respond(5, 6, fragments[5])
+        self.respond(6, 6, fragments[6])
+        self.assertIsNone(self.handler.gravacao)
+        self.respond(4, 6, fragments[4])
+
+        self.assertTrue(self.handler.gravacao.result(timeout=5))
+        self.assertEqual(self.handler.status, 0)
+        expected = b"".join(fragments[n] for n in range(1, 7))
+        self.assertEqual(Path(self.handler.archivo).read_bytes(), expected)
+
+
+class PhotoWriteResultTests(unittest.TestCase):
+    def setUp(self) -> None:
+        level = Log.log_level
+        Log.set_level(Log.ERROR)
+        self.addCleanup(Log.set_level, level)
+        self.tratador = TratadorDeFotos(":", "/tmp", "auto", 9009, "1234", 4)
+        self.tratador.task = FakeTimeout()
+        self.tratador.cola.append(["192.168.1.50", 7, 0, 3])
+        self.addCleanup(self.cleanup_tratador)
+
+    def cleanup_tratador(self) -> None:
+        if self.tratador.aviso is not None:
+            self.tratador.aviso.destroy()
+        if isinstance(self.tratador.task, Timeout):
+            self.tratador.task.cancel()
+
+    def run_event_loop_once(self) -> None:
+        # What the event loop does once the writer thread signals the pipe.
+        readable, _, _ = select.select([self.tratador.aviso.fd], [], [], 5)
+        self.assertEqual(readable, [self.tratador.aviso.fd])
+        self.tratador.aviso.read_callback()
+
+    def complete_in_worker(self, gravacao, result) -> None:
+        worker = threading.Thread(target=gravacao.set_result, args=(result,))
+        worker.start()
+        worker.join()
+
+    def test_failed_write_requeues_photo(self) -> None:
+        gravacao = Future()
+        self.tratador.resultado_foto(7, 0, 0, "/tmp/x.jpeg", gravacao=gravacao)
+        self.assertEqual(list(self.tratador.cola), [])
+        self.complete_in_worker(gravacao, False)
+        # The writer thread only signals; the queue changes in the loop thread.
+        self.assertEqual(list(self.tratador.cola), [])
+        self.run_event_loop_once()
+        self.assertEqual(list(self.tratador.cola), [["192.168.1.50", 7, 0, 2]])
+
+    def test_failed_write_after_queue_drained_rearms_task(self) -> None:
+        gravacao = Future()
+        self.tratador.resultado_foto(7, 0, 0, "/tmp/x.jpeg", gravacao=gravacao)
+        # Slow disk: the timer fires with an empty queue before the write ends.
+        self.tratador.obtiene_foto(self.tratador.task)
+        self.assertIsNone(self.tratador.task)
+
+        self.complete_in_worker(gravacao, False)
+        self.assertIsNone(self.tratador.task)
+        self.run_event_loop_once()
+
+        self.assertEqual(list(self.tratador.cola), [["192.168.1.50", 7, 0, 2]])
+        self.assertIsInstance(self.tratador.task, Timeout)
+        self.assertTrue(self.tratador.task.alive())
+
+    def test_failed_write_without_attempts_left_is_dropped(self) -> None:
+        self.tratador.cola[0][3] = 1
+        gravacao = Future()
+        gravacao.set_result(False)
+        self.tratador.resultado_foto(7, 0, 0, "/tmp/x.jpeg", gravacao=gravacao)
+        self.run_event_loop_once()
+        self.assertEqual(list(self.tratador.cola), [])
+
+    def test_successful_write_is_not_requeued(self) -> None:
+        gravacao = Future()
+        self.tratador.resultado_foto(7, 0, 0, "/tmp/x.jpeg", gravacao=gravacao)
+        self.complete_in_worker(gravacao, True)
+        self.run_event_loop_once()
+        self.assertEqual(list(self.tratador.cola), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import threading
+import unittest
+from types import SimpleNamespace
+
+from tests import _path  # noqa: F401
+from protocol_handlers.amt8000 import AMT8000ProtocolHandler, _EVENT_RE
+
+# Lines as printed by receptorip: timestamp, connection label, event text
+# (alarmeitbl/tratador.py) and the trailing photo field, empty here.
+PREFIX = b"2025-01-10 21:14:03 192.168.1.50:40120 "
+
+EVENT_LINES = (
+    (b"Disparo de zona 3 ", "zone_triggered", 3),
+    (b"Disparo de zona 12 ", "zone_triggered", 12),
+    (b"Disparo de zona 24h 5 ", "zone_triggered", 5),
+    (b"Disparo de zona 24h 64 ", "zone_triggered", 64),
+    (b"Disparo de zona 7 (con fotos, i=12 n=2)", "zone_triggered", 7),
+    ("Restauración de zona 12 ".encode(), "zone_restored", 12),
+    (b"Restauracao de zona 3", "zone_restored", 3),
+    ("Activación remota app P1 ".encode(), "arm", None),
+    ("Desactivación remota app P1 ".encode(), "disarm", None),
+    ("Pánico silencioso ".encode(), "panic", None),
+    (b"Falta de energia AC ", "ac_off", None),
+    (b"Retorno de energia AC ", "ac_on", None),
+    (b"Bateria del sistema baja ", "battery_low", None),
+    ("Recuperación bateria del sistema baja ".encode(), "battery_ok", None),
+)
+
+NON_EVENT_LINES = (
+    "Activación manual P1 ".encode(),
+    "Test periódico ".encode(),
+    b"Bypass de zona 4 ",
+    b"Tamper en sensor 3 ",
+    "Disparo silencioso 2 ".encode(),
+    b"Evento de alarma canal 11 contact_id 1234 tipo 18 qualificador 1 codigo 999 particion 1 zona 2",
+    b"inicio",
+)
+
+
+def make_handler(zone_ids=range(1, 65)):
+    zone_states = {}
+    handler = AMT8000ProtocolHandler(
+        alarm_client=None,
+        alarm_pass="123456",
+        mqtt_client=None,
+        base_topic="intelbras/alarm",
+        zone_ids=frozenset(zone_ids),
+        get_zone_state=zone_states.get,
+        alarm_lock=threading.Lock(),
+        set_zone_state=zone_states.__setitem__,
+        set_all_zone_states=lambda state: None,
+        publish_zone_states=lambda: None,
+        publish_triggered_zones_state=lambda: None,
+        publish_batch=lambda items: None,
+        scheduler=None,
+    )
+    return handler, zone_states
+
+
+class EventLineTests(unittest.TestCase):
+    def test_event_lines(self) -> None:
+        handler, _ = make_handler()
+        for text, event, zone_id in EVENT_LINES:
+            with self.subTest(line=text):
+                match = _EVENT_RE.search(PREFIX + text)
+                self.assertIsNotNone(match)
+                self.assertEqual(match.lastgroup, event)
+                if zone_id is not None:
+                    self.assertEqual(handler._extract_zone_id(match), zone_id)
+
+    def test_lines_that_must_not_match(self) -> None:
+        for text in NON_EVENT_LINES:
+            with self.subTest(line=text):
+                self.assertIsNone(_EVENT_RE.search(PREFIX + text))
+
+    def test_zone_outside_configured_range_is_ignored(self) -> None:
+        handler, zone_states = make_handler(zone_ids=range(1, 9))
+        match = _EVENT_RE.search(PREFIX + b"Disparo de zona 24h 12 ")
+        self.assertIsNone(handler._extract_zone_id(match))
+
+        publishes = []
+        self.assertFalse(handler._event_handlers[match.lastgroup](match, publishes))
+        self.assertEqual(zone_states, {})
+        self.assertEqual(publishes, [])
+
+    def test_zone_without_number_is_ignored(self) -> None:
+        handler, _ = make_handler()
+        with self.assertLogs(level="WARNING"):
+            match = _EVENT_RE.search(PREFIX + b"Disparo de zona ")
+            self.assertIsNone(handler._extract_zone_id(match))
+
+    def test_triggered_and_restored_update_zone_state(self) -> None:
+        handler, zone_states = make_handler()
+        steps = (
+            (b"Disparo de zona 24h 15 ", "Disparada"),
+            ("Restauración de zona 15 ".encode(), "Cerrada"),
+        )
+        for text, expected in steps:
+            match = _EVENT_RE.search(PREFIX + text)
+            publishes = []
+            self.assertTrue(handler._event_handlers[match.lastgroup](match, publishes))
+            self.assertEqual(zone_states[15], expected)
+
+
+class LastEventTests(unittest.TestCase):
+    def feed(self, handler, *texts) -> None:
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b"".join(PREFIX + text + b"\n" for text in texts))
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as stdout:
+            handler.receptorip_proc = SimpleNamespace(stdout=stdout)
+            with self.assertLogs(level="INFO"):
+                handler._process_receptorip_output()
+
+    def test_arm_and_ac_events_do_not_defer_polling(self) -> None:
+        handler, _ = make_handler()
+        self.feed(handler, "Activación remota app P1 ".encode(), b"Falta de energia AC ")
+        self.assertIsNone(handler.last_event_at)
+
+    def test_zone_and_battery_events_defer_polling(self) -> None:
+        for text in (b"Disparo de zona 3 ", b"Bateria del sistema baja "):
+            with self.subTest(line=text):
+                handler, _ = make_handler()
+                self.feed(handler, text)
+                self.assertIsNotNone(handler.last_event_at)
+
+
+if __name__ == "__main__":
+    unittest.main()
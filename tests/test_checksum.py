@@ -2,6 +2,7 @@ import unittest
 
 from tests import _path  # noqa: F401
 from isecnet.protocol.checksum import CRC16, Checksum
+from client import _STATUS_FRAME, _verify_frame, calculate_checksum
 
 
 class ChecksumTests(unittest.TestCase):
@@ -31,5 +32,24 @@ class CRC16Tests(unittest.TestCase):
         self.assertFalse(CRC16.validate_packet(packet[:-1] + b"\x00"))
 
 
+class AMT8000ChecksumTests(unittest.TestCase):
+    def test_calculate_checksum_matches_bytewise_xor(self) -> None:
+        data = bytes(range(0, 256, 7))
+        expected = 0
+        for byte in data:
+            expected ^= byte
+        self.assertEqual(calculate_checksum(data), expected ^ 0xFF)
+        self.assertEqual(calculate_checksum(b""), 0xFF)
+
+    def test_verify_frame_accepts_built_frame(self) -> None:
+        self.assertTrue(_verify_frame(_STATUS_FRAME))
+        self.assertTrue(_verify_frame(memoryview(_STATUS_FRAME)))
+
+    def test_verify_frame_rejects_corrupted_frame(self) -> None:
+        corrupted = bytearray(_STATUS_FRAME)
+        corrupted[-1] ^= 0x01
+        self.assertFalse(_verify_frame(corrupted))
+
+
 if __name__ == "__main__":
     unittest.main()
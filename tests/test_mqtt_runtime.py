@@ -0,0 +1,97 @@
+import random
+import threading
+import unittest
+
+from tests import _path  # noqa: F401
+from mqtt_runtime import MQTTRuntime
+
+
+class FakeMQTTClient:
+    def __init__(self) -> None:
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False, properties=None):
+        self.published.append((topic, payload))
+
+
+def make_runtime(zone_ids=range(1, 17)):
+    client = FakeMQTTClient()
+    runtime = MQTTRuntime(
+        mqtt_client=client,
+        base_topic="intelbras/alarm",
+        command_topic="intelbras/alarm/command",
+        availability_topic="intelbras/alarm/availability",
+        zone_ids=zone_ids,
+        alarm_lock=threading.Lock(),
+        protocol_handler_getter=lambda: None,
+    )
+    return runtime, client
+
+
+class ChangedZoneIdsTests(unittest.TestCase):
+    def test_matches_byte_by_byte_comparison(self) -> None:
+        rng = random.Random(1234)
+        for size in (1, 2, 8, 9, 65):
+            for _ in range(200):
+                published = bytes(rng.randrange(4) for _ in range(size))
+                snapshot = bytes(
+                    rng.randrange(4) if rng.random() < 0.3 else code for code in published
+                )
+                expected = [i for i in range(size) if snapshot[i] != published[i]]
+                self.assertEqual(MQTTRuntime._changed_zone_ids(snapshot, published), expected)
+
+    def test_identical_snapshots_have_no_changes(self) -> None:
+        self.assertEqual(MQTTRuntime._changed_zone_ids(b"\x01\x02\x03", b"\x01\x02\x03"), [])
+
+
+class PublishZoneStatesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.runtime, self.client = make_runtime()
+        with self.runtime.alarm_lock:
+            self.runtime.set_all_zone_states("Cerrada")
+        self.runtime.publish_zone_states()
+        self.client.published.clear()
+
+    def published_zone_topics(self):
+        return [topic for topic, _ in self.client.published if topic != self.runtime.zones_topic]
+
+    def test_publishes_only_changed_zone_topics(self) -> None:
+        with self.runtime.alarm_lock:
+            self.runtime.set_zone_state(3, "Abierta")
+            self.runtime.set_zone_state(12, "Disparada")
+        self.runtime.publish_zone_states()
+
+        self.assertEqual(
+            sorted(self.published_zone_topics()),
+            ["intelbras/alarm/zone_12", "intelbras/alarm/zone_3"],
+        )
+        published = dict(self.client.published)
+        self.assertEqual(published["intelbras/alarm/zone_3"], "Abierta")
+        self.assertEqual(published["intelbras/alarm/zone_12"], "Disparada")
+        self.assertIn(self.runtime.zones_topic, published)
+
+    def test_publishes_nothing_without_changes(self) -> None:
+        self.runtime.publish_zone_states()
+        with self.runtime.alarm_lock:
+            self.runtime.set_zone_state(5, "Cerrada")
+        self.runtime.publish_zone_states()
+
+        self.assertEqual(self.client.published, [])
+
+    def test_zone_changed_and_restored_is_not_republished(self) -> None:
+        with self.runtime.alarm_lock:
+            self.runtime.set_zone_state(7, "Abierta")
+            self.runtime.set_zone_state(7, "Cerrada")
+        self.runtime.publish_zone_states()
+
+        self.assertEqual(self.client.published, [])
+
+    def test_publish_all_zone_states_sends_every_zone(self) -> None:
+        self.runtime._last_published.clear()
+        self.runtime.publish_all_zone_states()
+
+        self.assertEqual(len(self.published_zone_topics()), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
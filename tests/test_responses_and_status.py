@@ -1,6 +1,15 @@
 import unittest
+from unittest import mock
 
 from tests import _path  # noqa: F401
+from client import (
+    ZONE_STATUS_PAYLOAD_OFFSET,
+    Client,
+    CommunicationError,
+    _finish_frame,
+    _frame_prefix,
+    get_zones_status_from_payload,
+)
 from isecnet.const import ResponseCode
 from isecnet.protocol.commands.connection import ConnectionChannel, ConnectionInfo
 from isecnet.protocol.commands.status import (
@@ -77,5 +86,118 @@ class ConnectionInfoTests(unittest.TestCase):
         self.assertEqual(info.channel, ConnectionChannel.ETHERNET)
 
 
+class FakeSocket:
+    """Socket that hands out the given chunks, one per recv_into call."""
+
+    def __init__(self, chunks) -> None:
+        self.chunks = [bytes(chunk) for chunk in chunks]
+        self.sent = b""
+        self.recv_calls = 0
+        self.closed = False
+
+    def sendall(self, data) -> None:
+        self.sent += bytes(data)
+
+    def recv_into(self, view) -> int:
+        self.recv_calls += 1
+        if not self.chunks:
+            return 0
+        chunk = self.chunks[0]
+        count = min(len(chunk), len(view))
+        view[:count] = chunk[:count]
+        if count < len(chunk):
+            self.chunks[0] = chunk[count:]
+        else:
+            self.chunks.pop(0)
+        return count
+
+    def shutdown(self, how) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def connected_client(sock) -> Client:
+    client = Client("127.0.0.1", 9009)
+    client._socket = sock
+    client._is_connected = True
+    return client
+
+
+class AMT8000FramingTests(unittest.TestCase):
+    # Auth response: 8-byte header, result 0x00 and checksum.
+    RESPONSE = _finish_frame(_frame_prefix([0xF0, 0xF0], 1), b"\x00")
+
+    def test_frame_split_across_several_recv_calls(self) -> None:
+        chunks = [self.RESPONSE[:3], self.RESPONSE[3:8], self.RESPONSE[8:9], self.RESPONSE[9:]]
+        sock = FakeSocket(chunks)
+        client = connected_client(sock)
+
+        response = client._send_command_and_receive_response(b"\x01")
+
+        self.assertEqual(response, self.RESPONSE)
+        self.assertEqual(sock.recv_calls, 4)
+        self.assertTrue(client.is_connected)
+
+    def test_frame_larger_than_receive_buffer(self) -> None:
+        params = bytes(range(256)) * 6
+        response_frame = _finish_frame(_frame_prefix([0x0B, 0x4A], len(params)), params)
+        sock = FakeSocket([response_frame[i:i + 100] for i in range(0, len(response_frame), 100)])
+        client = connected_client(sock)
+
+        self.assertEqual(client._send_command_and_receive_response(b"\x01"), response_frame)
+
+    def test_frame_shorter_than_header_raises(self) -> None:
+        sock = FakeSocket([self.RESPONSE[:5]])
+        client = connected_client(sock)
+
+        with self.assertRaises(CommunicationError):
+            client._send_command_and_receive_response(b"\x01")
+        self.assertFalse(client.is_connected)
+
+    def test_checksum_mismatch_closes_socket(self) -> None:
+        corrupted = bytearray(self.RESPONSE)
+        corrupted[-1] ^= 0xFF
+        sock = FakeSocket([corrupted])
+        client = connected_client(sock)
+
+        with self.assertRaises(CommunicationError):
+            client._send_command_and_receive_response(b"\x01")
+        self.assertTrue(sock.closed)
+        self.assertFalse(client.is_connected)
+
+
+class ZonesStatusTests(unittest.TestCase):
+    def test_str_keys_match_bitwise_decoding(self) -> None:
+        zone_bytes = bytes([0x01, 0x80, 0x00, 0xff, 0x5a, 0x00, 0x00, 0x81])
+        payload = bytes(ZONE_STATUS_PAYLOAD_OFFSET) + zone_bytes
+        expected = {
+            str(i * 8 + bit + 1): "open" if byte >> bit & 1 else "closed"
+            for i, byte in enumerate(zone_bytes)
+            for bit in range(8)
+        }
+        self.assertEqual(get_zones_status_from_payload(payload), expected)
+
+    def test_num_zones_limits_keys(self) -> None:
+        payload = bytes(ZONE_STATUS_PAYLOAD_OFFSET) + b"\x04" * 8
+        self.assertEqual(
+            get_zones_status_from_payload(payload, 3), {"1": "closed", "2": "closed", "3": "open"}
+        )
+
+
+class ConnectTests(unittest.TestCase):
+    def test_socket_closed_when_configure_fails(self) -> None:
+        sock = mock.Mock()
+        client = Client("127.0.0.1", 9009)
+        with mock.patch("client.socket.socket", return_value=sock), \
+                mock.patch.object(Client, "_configure_socket", side_effect=OSError("setsockopt")):
+            with self.assertRaises(CommunicationError):
+                client.connect()
+        sock.close.assert_called_once_with()
+        self.assertIsNone(client._socket)
+        self.assertFalse(client.is_connected)
+
+
 if __name__ == "__main__":
     unittest.main()
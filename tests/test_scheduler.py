@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+
+from tests import _path  # noqa: F401
+from scheduler import Scheduler
+
+
+class SchedulerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scheduler = Scheduler()
+        self.addCleanup(self.scheduler.stop)
+
+    def test_runs_callbacks_in_deadline_order(self) -> None:
+        order = []
+        done = threading.Event()
+        self.scheduler.schedule_after(0.06, lambda: order.append("c"))
+        self.scheduler.schedule_after(0.02, lambda: order.append("a"))
+        self.scheduler.schedule_after(0.04, lambda: order.append("b1"))
+        self.scheduler.schedule_after(0.04, lambda: order.append("b2"))
+        self.scheduler.schedule_after(0.08, done.set)
+        self.scheduler.start()
+
+        self.assertTrue(done.wait(2.0))
+        # Equal deadlines keep their scheduling order.
+        self.assertEqual(order, ["a", "b1", "b2", "c"])
+
+    def test_stop_wakes_sleeping_thread(self) -> None:
+        self.scheduler.schedule_after(60.0, lambda: None)
+        self.scheduler.start()
+        time.sleep(0.05)
+
+        self.scheduler.stop()
+        self.scheduler._thread.join(1.0)
+        self.assertFalse(self.scheduler._thread.is_alive())
+
+    def test_stop_wakes_idle_thread(self) -> None:
+        self.scheduler.start()
+        time.sleep(0.05)
+
+        self.scheduler.stop()
+        self.scheduler._thread.join(1.0)
+        self.assertFalse(self.scheduler._thread.is_alive())
+
+    def test_earlier_task_wakes_wait(self) -> None:
+        ran = threading.Event()
+        self.scheduler.schedule_after(60.0, lambda: None)
+        self.scheduler.start()
+        time.sleep(0.05)
+
+        started = time.monotonic()
+        self.scheduler.schedule_after(0.01, ran.set)
+        self.assertTrue(ran.wait(2.0))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_failing_callback_does_not_stop_scheduler(self) -> None:
+        ran = threading.Event()
+
+        def fail() -> None:
+            raise RuntimeError("boom")
+
+        self.scheduler.schedule_after(0.0, fail)
+        self.scheduler.schedule_after(0.01, ran.set)
+        with self.assertLogs(level="ERROR"):
+            self.scheduler.start()
+            self.assertTrue(ran.wait(2.0))
+
+
+if __name__ == "__main__":
+    unittest.main()